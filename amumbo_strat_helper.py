@@ -1,8 +1,9 @@
-import yfinance as yf
+from market_data import price_cache
+from instrument import instrumented, span
+from indicators import multi_sma, rolling_quantiles
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import matplotlib.pyplot as plt
 from sys import argv
 
 # On Linux or with different python version the commented out code might be needed!
@@ -25,17 +26,17 @@ VIX_M75_COLORS = ["gold",
 
 # Function to get VIX data
 def get_vix_data():
-    vix = yf.download('^VIX', period='2y', interval='1d')
+    vix = price_cache.history('^VIX', '1d', period='2y').copy()  # copy as indicator columns get added
     return vix
 
 # Function to get S&P 500 data
 def get_sp500_data():
-    sp500 = yf.download('^GSPC', period='2y', interval='1d')
+    sp500 = price_cache.history('^GSPC', '1d', period='2y').copy()  # copy as indicator columns get added
     return sp500
 
 # Function to get Amumbo data
 def get_amumbo_data():
-    amumbo = yf.download('18MF.DE', period='2y', interval='1d')
+    amumbo = price_cache.history('18MF.DE', '1d', period='2y').copy()  # copy as indicator columns get added
     return amumbo
 
 # Function to calculate Simple Moving Average
@@ -44,18 +45,29 @@ def calculate_sma(data, smaPeriod):
     return data
 def calculate_sma200(data): return calculate_sma(data, 200)
 
+# Function to calculate the Simple Moving Averages of several periods in one pass
+@instrumented()
+def calculate_smas(data, smaPeriods, dtype=np.float64):
+    smas, labels = multi_sma(data['Close'].to_numpy(), smaPeriods, dtype)
+    data[labels] = smas.T
+    return data
+
 # Function to calculate Moving 75%-ile
-def calculate_m75(data, m75Period):
-    data[f'M75_{m75Period}'] = data['Close'].rolling(window=m75Period).apply(lambda x: np.percentile(x, 75), raw=True)
+def calculate_m75(data, m75Period): return calculate_m75s(data, [m75Period])
+
+# Function to calculate the Moving 75%-iles of several periods in one pass
+@instrumented()
+def calculate_m75s(data, m75Periods):
+    m75s, labels = rolling_quantiles(data['Close'].to_numpy(), m75Periods, [0.75])
+    data[labels] = m75s.T
     return data
 
 # Function to check for warning signals
+@instrumented()
 def check_signals(sp500_data, amumbo_data, vix_data, vix_thresh, sma_period):
     '''VIX Routine'''
-    # Calculate M75 for VIX
-    vix_data = calculate_m75(vix_data, 7)  # week m75 support
-    vix_data = calculate_m75(vix_data, 14) # 14d m75 support
-    vix_data = calculate_m75(vix_data, 30) # month m75 support
+    # Calculate week, 14d and month M75 support for VIX in one pass
+    vix_data = calculate_m75s(vix_data, [7, 14, 30])
 
     # Latest VIX value and short period SMA
     latest_vix = vix_data['Close'].iloc[-1].tolist() #[0]
@@ -64,15 +76,8 @@ def check_signals(sp500_data, amumbo_data, vix_data, vix_thresh, sma_period):
     latest_vix_m75_30 = vix_data['M75_30'].iloc[-1].tolist()
     
     '''S&P 500 Routine'''
-    # Calculate SMA200 for S&P 500
-    sp500_data = calculate_sma200(sp500_data)
-
-    # Calculate 1 month, 3 month, 1 year and 150 SMA for S&P 500
-    sp500_data = calculate_sma(sp500_data, sma_period)
-    sp500_data = calculate_sma(sp500_data, 31)  # month sma support
-    sp500_data = calculate_sma(sp500_data, 92)  # quarter sma support
-    sp500_data = calculate_sma(sp500_data, 150) # three quater 200sma support
-    sp500_data = calculate_sma(sp500_data, 365) # year sma support
+    # Calculate SMA200 and 1 month, 3 month, 1 year and 150 SMA for S&P 500 in one pass
+    sp500_data = calculate_smas(sp500_data, [200, sma_period, 31, 92, 150, 365])
     
     # Latest S&P 500 price and SMA200
     latest_sp500_price = sp500_data['Close'].iloc[-1].tolist() #[0]
@@ -89,15 +94,8 @@ def check_signals(sp500_data, amumbo_data, vix_data, vix_thresh, sma_period):
             elif '50' in sma: latest_sp500_sma50 = sp500_data[sma].iloc[-1].tolist()
     
     '''Amumbo Routine'''
-    # Calculate SMA200 for AMUMBO
-    amumbo_data = calculate_sma200(amumbo_data)
-
-    # Calculate 1 month, 3 month, 1 year and 150 SMA for AMUMBO
-    amumbo_data = calculate_sma(amumbo_data, sma_period)
-    amumbo_data = calculate_sma(amumbo_data, 31)  # month sma support
-    amumbo_data = calculate_sma(amumbo_data, 92)  # quarter sma support
-    amumbo_data = calculate_sma(amumbo_data, 150) # three quater 200sma support
-    amumbo_data = calculate_sma(amumbo_data, 365) # year sma support
+    # Calculate SMA200 and 1 month, 3 month, 1 year and 150 SMA for AMUMBO in one pass
+    amumbo_data = calculate_smas(amumbo_data, [200, sma_period, 31, 92, 150, 365])
     
     # Latest AMUMBO price and SMA500
     latest_amumbo_price = amumbo_data['Close'].iloc[-1].tolist() #[0]
@@ -182,6 +180,8 @@ def check_signals(sp500_data, amumbo_data, vix_data, vix_thresh, sma_period):
     print("\n")
 
 def plot_scraped_data(ticker_data, vix_data, vix_thresh, sma_period, ticker_name): # ticker="^GSPC"):
+    import matplotlib.pyplot as plt  # deferred, signal checks without plots never load matplotlib
+
     # Plotting
     fig, ax1 = plt.subplots(figsize=(14, 7))
 
@@ -237,16 +237,18 @@ def plot_scraped_data(ticker_data, vix_data, vix_thresh, sma_period, ticker_name
 # Main function
 def main(vix_thresh, sma_period):
     # Get data
-    vix_data = get_vix_data()
-    sp500_data = get_sp500_data()
-    amumbo_data = get_amumbo_data()
+    with span("fetch", ticker='^VIX'): vix_data = get_vix_data()
+    with span("fetch", ticker='^GSPC'): sp500_data = get_sp500_data()
+    with span("fetch", ticker='18MF.DE'): amumbo_data = get_amumbo_data()
     
     # Check signals
     check_signals(sp500_data, amumbo_data, vix_data, vix_thresh, sma_period)
 
     # Plot the scraped data
-    plot_scraped_data(sp500_data, vix_data, vix_thresh, sma_period, ticker_name='S&P 500')  #, ticker="^GSPC")
-    plot_scraped_data(amumbo_data, vix_data, vix_thresh, sma_period, ticker_name='Amumbo')  #, ticker="18MF.DE")
+    with span("plot", ticker='S&P 500'):
+        plot_scraped_data(sp500_data, vix_data, vix_thresh, sma_period, ticker_name='S&P 500')  #, ticker="^GSPC")
+    with span("plot", ticker='Amumbo'):
+        plot_scraped_data(amumbo_data, vix_data, vix_thresh, sma_period, ticker_name='Amumbo')  #, ticker="18MF.DE")
     
     
 # Run the script
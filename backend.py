@@ -3,146 +3,126 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
-import matplotlib.dates as mdates
 from matplotlib.colors import Normalize
-from sklearn.linear_model import LinearRegression
 import statsmodels.api as sm
 from yfinance import Ticker
-from typing import List
-
-months = ['Jan','Feb','Mar','Apr','Mai','Jun','Jul','Aug','Sep','Oct','Nov','Dec']
+from typing import List, Optional
+from regression import batch_three_layer_forecast
+from model_store import ModelStore, index_dates
+from market_data import FundamentalsCache, PriceCache, price_cache, fetch_concurrently, parse_earnings_dates
+from chart_render import CHARTS, CHART_SIZE, months, month_period
+from holdings import holdings_matrix, overlap_matrix
+from correlation import return_correlation, top_k_pairs
+from metrics import annual_volatility, annual_yields, pe_ratio, total_return
+from instrument import instrumented, span, traced
 
 # Define the date range to retrieve data for
 start_date = str(date.today()-timedelta(days=5*365))
 end_date = str(date.today())
 
-# Dividend Settings
-month_period = 6
-
-# helper function
-def get_rid_of_shit(x:str):
-    arr = x.split(",")[:-1]
-    return arr[0]+","+arr[1]
-correct = np.vectorize(get_rid_of_shit)
-
-
-def three_layer_linear_regressor(series: pd.Series, tag:str, timings: List[int] = [36,24,12,6,3], 
-                                 in_months: bool = True, repeat: int = 3):
-    # model at different pred depth
-    model_zoo = list()
-    for timing in timings:
-        y = series.iloc[timing:].to_numpy()         # use all but the first timeframe as target data
-        # train set window split
-        X = np.array([[series.to_numpy()[idx+offset] for offset in range(timing)] \
-             for idx in range(len(series)-timing)])  # use all but the last timeframe as training data                
-        for it in range(repeat):  
-            model = LinearRegression()
-            model.coef_ = np.random.random((X.shape))
-            model.fit(X, y)
-            model_zoo.append(model)
-
-    # first merge using all depths
-    model_layer_two = list()
-    for it in range(repeat):
-        X = list()
-        for idx in range(max(timings),len(series)):
-            X.append([
-                model_zoo[it::repeat][num].predict(
-                np.array([series.iloc[idx-timings[num]+offset] for offset in range(timings[num])]).reshape(1,-1)
-                )[0] \
-                    for num in range(len(model_zoo[it::repeat]))])
-        X = np.array(X)
-        y = series.iloc[max(timings):].to_numpy()
-        model = LinearRegression()
-        model.fit(X, y)
-        model_layer_two.append(model)
-    
-    # general model using all versions at all depths
-    X = list()
-    for idx in range(max(timings),len(series)):
-        X.append([
-            model_layer_two[it].predict(np.array([
-                model_zoo[it::repeat][num].predict(
-                np.array([series.iloc[idx-timings[num]+offset] for offset in range(timings[num])]).reshape(1,-1)
-                )[0] for num in range(len(model_zoo[it::repeat]))
-            ]).reshape(1,-1))[0] for it in range(len(model_layer_two))])
-    X = np.array(X)
-    y = series.iloc[max(timings):].to_numpy()
-    model = LinearRegression()
-    model.fit(X, y)
-
-    # predictions with general model for future year
-    if in_months:
-        future_index = pd.date_range(date.today(), periods=12, freq='M')
-        input_vec = [[
-            model_layer_two[it].predict(np.array([
-                model_zoo[it::repeat][num].predict(
-                np.array([series.iloc[-timings[num]+month+offset] for offset in range(timings[num])]).reshape(1,-1)
-                )[0] for num in range(len(model_zoo[it::repeat]))
-            ]).reshape(1,-1))[0] for it in range(len(model_layer_two))]
-        for month in range(12)]
-
-        future_year_preds = pd.DataFrame({'Date': future_index, tag: np.clip(model.predict(input_vec),0,None) }).set_index('Date')
+# helper function to extract annual earnings of the last years from an earnings history and fill in NaNs
+def parse_earnings(earnings: pd.DataFrame) -> pd.Series:
+    earnings["Date"] = parse_earnings_dates(earnings["Earnings Date"])
+    earnings = earnings.set_index("Date")["Reported EPS"].fillna(method='ffill').fillna(method='bfill')
+    earnings = earnings[pd.to_datetime('now').year-5<=pd.DatetimeIndex(earnings.index).year]
+    earnings = earnings[pd.DatetimeIndex(earnings.index).year<=pd.to_datetime('now').year]
+    earnings = earnings[(pd.DatetimeIndex(earnings.index).month<=pd.to_datetime('now').month).__or__(pd.DatetimeIndex(earnings.index).year<pd.to_datetime('now').year)]
+    return earnings.groupby(pd.DatetimeIndex(earnings.index).year).first()
+
+
+# Function to forecast several series with the three layer regressor and append the forecasts
+# -> with a model store and one key per series (e.g. 'SPY/Close') fitted models are kept between runs, a series that
+#    only gained, lost or revised a few months is updated instead of refitted
+def batch_three_layer_linear_regressor(series: List[pd.Series], tags: List[str], timings: List[int] = [36,24,12,6,3], 
+                                       in_months: bool = True, repeat: int = 3, keys: Optional[List[str]] = None,
+                                       store: Optional[ModelStore] = None) -> List[pd.Series]:
+    # predictions for future year or next year
+    if in_months: future_index, steps = pd.date_range(date.today(), periods=12, freq='M', name='Date'), range(12)
+    else: future_index, steps = pd.date_range(date.today(), periods=1, freq='Y', name='Date'), [1]
+
+    if store is not None and keys is not None:
+        preds, _ = store.batch_forecast(keys, [s.to_numpy(dtype=float) for s in series], [index_dates(s.index) for s in series],
+                                        timings, repeat, steps)
     else:
-        future_index = pd.date_range(date.today(), periods=1, freq='Y')
-        input_vec = [[
-            model_layer_two[it].predict(np.array([
-                model_zoo[it::repeat][num].predict(
-                np.array([series.iloc[-timings[num]+1+offset] for offset in range(timings[num])]).reshape(1,-1)
-                )[0] for num in range(len(model_zoo[it::repeat]))
-            ]).reshape(1,-1))[0] for it in range(len(model_layer_two))]]
-        future_year_preds = pd.DataFrame({'Date': future_index, tag: model.predict(input_vec) }).set_index('Date')
+        # stack all equally long series and fit all of them in one vectorized solve
+        preds = [None]*len(series)
+        lengths = np.array([len(s) for s in series])
+        for length in np.unique(lengths):
+            group = np.flatnonzero(lengths==length)
+            values = np.array([series[idx].to_numpy(dtype=float) for idx in group])
+            for idx,pred in zip(group, batch_three_layer_forecast(values, timings, repeat, steps)): preds[idx] = pred
 
-    # output
-    return pd.concat([series, future_year_preds[tag]])
+    outputs = list()
+    for s,tag,pred in zip(series,tags,preds):
+        if in_months: pred = np.clip(pred,0,None)
+        outputs.append(pd.concat([s, pd.Series(pred, index=future_index, name=tag)]))
+    return outputs
 
 
-def create_plot_tickers(tickers: List[Ticker], syms: List[str], types:List[str]):
+def three_layer_linear_regressor(series: pd.Series, tag:str, timings: List[int] = [36,24,12,6,3], 
+                                 in_months: bool = True, repeat: int = 3, key: Optional[str] = None,
+                                 store: Optional[ModelStore] = None):
+    return batch_three_layer_linear_regressor([series], [tag], timings, in_months, repeat, [key] if key else None, store)[0]
+
+
+# Function to gather the data of all tickers, fit the forecasts and compute the metrics create_plot_tickers shows
+# -> returns DataFrames (columns are the tickers) keyed like the charts in chart_render.CHARTS,
+#    with top_pairs only the top_pairs most correlated ticker pairs are listed instead of the full correlation matrix
+@instrumented()
+def compute_ticker_metrics(syms: List[str], types: List[str], cache: PriceCache = price_cache,
+                           top_pairs: Optional[int] = None, fundamentals: Optional[FundamentalsCache] = None,
+                           models: Optional[ModelStore] = None) -> dict:
+    # load monthly bars (served from the local cache, only new bars are downloaded) and earnings of all tickers concurrently,
+    # -> earnings and infos come from the fundamentals cache (next to the price cache by default) and are only requested
+    #    again once new earnings are due
+    fundamentals = fundamentals or FundamentalsCache(cache.root, cache.provider)
+    models = models or ModelStore(cache.root)
+    # every request is a span of its ticker (children of the compute_ticker_metrics span)
+    fetched, failed = fetch_concurrently({**{(sym,'history'): (traced("fetch_history", sym, cache.history), (sym, '1mo', start_date, end_date)) for sym in syms},
+                                         **{(sym,'earnings'): (traced("fetch_earnings", sym, fundamentals.earnings_history), (sym,)) for sym in syms}})
+
+    # extract annual earnings, tickers without usable earnings history fall back to their trailing EPS
+    all_earnings = dict()
+    for sym in syms:
+        with span("parse_earnings", sym):
+            try: all_earnings[sym] = parse_earnings(fetched[(sym,'earnings')])
+            except: pass
+    infos, _ = fetch_concurrently({sym: (traced("fetch_info", sym, fundamentals.info), (sym,)) for sym in syms if sym not in all_earnings})
 
-    all_total_return, all_dividends, all_stock_prices, all_stock_peRatio = [list(),list(),list(),list()]
-    for ticker,inv_type in zip(tickers,types):
-        df = ticker.history(start=start_date, end=end_date, interval='1mo')
+    all_dividends, all_stock_prices, all_annual_earnings = [list(),list(),list()]
+    all_close, all_divs = list(), list()
+    for sym in syms:
+        if (sym,'history') in failed: raise failed[(sym,'history')]
+        df = fetched[(sym,'history')]
 
         # fill NaN values with previous row values
-        df['Close'] = df['Close'].fillna(method='ffill').fillna(method='bfill')
-        df['Dividends'] = df['Dividends'].fillna(0)
-
-        # train and use linear regression model to predict changes in stock price and dividends for next year
-        timings = [36,24,12,6,3]  # time windows for regressors 
-        monthly_close = three_layer_linear_regressor(df["Close"], "Close", timings, in_months=True)
-        dividends = three_layer_linear_regressor(df["Dividends"], "Dividends", timings, in_months=True)
-
+        all_close.append(df['Close'].fillna(method='ffill').fillna(method='bfill'))
+        all_divs.append(df['Dividends'].fillna(0))
+
+    # train and use linear regression model to predict changes in stock price and dividends for next year
+    # -> close and dividend regressors of all tickers are fitted together in one batched solve,
+    #    models stored by the last run are only updated by the months that changed since
+    timings = [36,24,12,6,3]  # time windows for regressors 
+    with span("regression"):
+        forecasts = batch_three_layer_linear_regressor(all_close+all_divs, ["Close"]*len(all_close)+["Dividends"]*len(all_divs), 
+                                                       timings, in_months=True, keys=[f"{sym}/Close" for sym in syms]+[f"{sym}/Dividends" for sym in syms],
+                                                       store=models)
+
+    for sym,inv_type,monthly_close,dividends in zip(syms,types,forecasts[:len(syms)],forecasts[len(syms):]):
         # format results
         monthly_close.index = pd.DatetimeIndex([str(date).split(" ")[0] for date in monthly_close.index])
         monthly_close.index.name = "Date"
         dividends.index = pd.DatetimeIndex([str(date).split(" ")[0] for date in dividends.index])
         dividends.index.name = "Date"
 
-        # extract annual earnings and fill in NaNs
-        earnings = None
-        try: 
-            earnings = ticker.earnings_history
-            earnings["Date"] = pd.DatetimeIndex(correct(earnings["Earnings Date"]))
-            earnings = earnings.set_index("Date")["Reported EPS"].fillna(method='ffill').fillna(method='bfill')
-            earnings = earnings[pd.to_datetime('now').year-5<=pd.DatetimeIndex(earnings.index).year]
-            earnings = earnings[pd.DatetimeIndex(earnings.index).year<=pd.to_datetime('now').year]
-            earnings = earnings[(pd.DatetimeIndex(earnings.index).month<=pd.to_datetime('now').month).__or__(pd.DatetimeIndex(earnings.index).year<pd.to_datetime('now').year)]
-            earnings = earnings.groupby(pd.DatetimeIndex(earnings.index).year).first()
-        except: 
-            earnings = pd.DataFrame(np.zeros(len(monthly_close[:-12:12]))+ticker.info["epsTrailingTwelveMonths"],index=monthly_close[:-12:12].index)[0]
+        # annual earnings or trailing EPS as constant fallback
+        if sym in all_earnings: earnings = all_earnings[sym]
+        else: earnings = pd.DataFrame(np.zeros(len(monthly_close[:-12:12]))+infos[sym]["epsTrailingTwelveMonths"],index=monthly_close[:-12:12].index)[0]
         
         # train a linear regression model to predict changes in earnings
         timings = [3,2,1]  # time windows for regressors
-        annual_earnings = three_layer_linear_regressor(earnings, "Earnings", timings, in_months=False)
-
-        # Calculate the monthly returns for each ticker
-        monthly_returns = monthly_close.pct_change().replace(float('inf'), 0)
-
-        # Calculate the cumulative growth for each ticker
-        cumulative_growth = (1 + monthly_returns).cumprod()
-
-        # Calculate the total return (growth + dividends) for each ticker
-        total_return = cumulative_growth * (1 + dividends / monthly_close.shift(1).replace(0,1)).cumprod()
+        with span("earnings_regression", sym):
+            annual_earnings = three_layer_linear_regressor(earnings, "Earnings", timings, in_months=False, key=f"{sym}/Earnings", store=models)
 
         #if inv_type == "Fund" or inv_type == "ETF":
         #    try:
@@ -153,85 +133,59 @@ def create_plot_tickers(tickers: List[Ticker], syms: List[str], types:List[str])
         #        cap_gain = pd.DataFrame(np.ones(len(monthly_close)),index=monthly_close.index)[0]
 
         all_dividends.append(dividends)
-        all_total_return.append(total_return)
         all_stock_prices.append(monthly_close)
-        all_stock_peRatio.append(pd.DataFrame(monthly_close.iloc[::12].to_numpy()/annual_earnings.clip(lower=1e-8).to_numpy(),index=monthly_close.iloc[::12].index)[0])
-
-
-    # Plot cumulative growth and dividends
-    ax1  = plt.figure(1,figsize=(10, 8)).gca()
-    ax2  = plt.figure(2,figsize=(10, 8)).gca()
-    ax3  = plt.figure(3,figsize=(10, 8)).gca()
-    ax4  = plt.figure(4,figsize=(10, 8)).gca()
-    fig5 = plt.figure(5,figsize=(10, 8))
-    ax5  = fig5.gca()
-    ax6  = plt.figure(6,figsize=(10, 8)).gca()
-    ax7  = plt.figure(7,figsize=(10, 8)).gca()
-
-    all_stock_prices = pd.concat(all_stock_prices, axis=1, keys=syms).fillna(method='ffill').fillna(method='bfill')
-    all_dividends = pd.concat(all_dividends, axis=1, keys=syms).fillna(0)
-    all_stock_peRatio = pd.concat(all_stock_peRatio, axis=1, keys=syms).fillna(method='ffill').fillna(method='bfill')
-    all_total_return = pd.concat(all_total_return, axis=1, keys=syms).fillna(method='ffill').fillna(method='bfill')*100
-    corr_mat = (all_stock_prices.corr()*100).round(2)
-    all_annual_yields = pd.DataFrame(((all_stock_prices.iloc[12::12].to_numpy()/all_stock_prices.iloc[:-12:12].to_numpy())-1)*100,
-                                     columns=all_stock_prices.columns, index=all_stock_prices.iloc[12::12].index)
-    all_annual_volatility = pd.DataFrame([(all_stock_prices.iloc[it*12:(it+1)*12].std().to_numpy()/all_stock_prices.iloc[(it+1)*12].to_numpy())*100 for it in range(((len(all_stock_prices)-1)//12))],
-                                     columns=all_stock_prices.columns, index=(all_stock_prices.iloc[12::12]).iloc[:((len(all_stock_prices)-1)//12)].index)
-
-    all_stock_prices.plot.line(ax=ax1)
-    all_dividends.plot.bar(ax=ax2,stacked=True)
-    all_stock_peRatio.plot.line(ax=ax3)
-    all_total_return.plot.line(ax=ax4)
-    ax5.imshow(corr_mat,cmap=cm.get_cmap('jet'),norm=Normalize(vmin=-100,vmax=100))
-    for i,col in enumerate(corr_mat.columns): 
-        for j,row in enumerate(corr_mat.index):
-            if -50<corr_mat[col].loc[row]<90:
-                ax5.text(j, i, corr_mat[col].loc[row], ha="center", va="center", color="k")
-            else:
-                ax5.text(j, i, corr_mat[col].loc[row], ha="center", va="center", color="w")
-    ax5.set_xticks([*range(len(corr_mat.index))],labels=corr_mat.index)
-    ax5.set_yticks([*range(len(corr_mat.columns))],labels=corr_mat.columns)
-    fig5.colorbar(cm.ScalarMappable(norm=Normalize(vmin=-100,vmax=100), cmap=cm.get_cmap('jet')), ax=ax5)
-    all_annual_yields.plot.line(ax=ax6)
-    all_annual_volatility.plot.line(ax=ax7)
+        all_annual_earnings.append(pd.Series(annual_earnings.to_numpy(), index=monthly_close.iloc[::12].index))
+
+
+    # align all tickers into (months x tickers) frames and compute the metrics column-wise on their arrays
+    with span("metrics"):
+        all_stock_prices = pd.concat(all_stock_prices, axis=1, keys=syms).fillna(method='ffill').fillna(method='bfill')
+        all_dividends = pd.concat(all_dividends, axis=1, keys=syms).fillna(0)
+        all_annual_earnings = pd.concat(all_annual_earnings, axis=1, keys=syms)
+        prices = all_stock_prices.to_numpy()
+        years = (len(prices)-1)//12
+        frame = lambda values, index: pd.DataFrame(values, columns=all_stock_prices.columns, index=index)
+        all_stock_peRatio = frame(pe_ratio(all_stock_prices.reindex(all_annual_earnings.index).to_numpy(), all_annual_earnings.to_numpy()),
+                                  all_annual_earnings.index).fillna(method='ffill').fillna(method='bfill')
+        all_total_return = frame(total_return(prices, all_dividends.to_numpy()),
+                                 all_stock_prices.index).fillna(method='ffill').fillna(method='bfill')*100
+        all_annual_yields = frame(annual_yields(prices), all_stock_prices.index[12::12])
+        all_annual_volatility = frame(annual_volatility(prices), all_stock_prices.index[12:years*12+1:12])
+
+    metrics = {"prices": all_stock_prices, "dividends": all_dividends, "pe_ratio": all_stock_peRatio,
+               "total_return": all_total_return, "annual_yields": all_annual_yields,
+               "annual_volatility": all_annual_volatility}
+
+    # correlation of log returns (price levels of trending tickers always look correlated)
+    with span("correlation"):
+        if top_pairs: metrics["top_pairs"] = top_k_pairs(all_stock_prices, list(all_stock_prices.columns), top_pairs)
+        else: metrics["correlation"] = return_correlation(all_stock_prices)
+    return metrics
+
+
+# Function to show the metrics of compute_ticker_metrics as interactive figures
+@instrumented()
+def plot_ticker_metrics(metrics: dict):
+    for num,(name,draw) in enumerate(CHARTS.items(), start=1):
+        if name not in metrics: continue
+        with span("plot", chart=name):
+            fig = plt.figure(num, figsize=CHART_SIZE)
+            draw(fig, fig.gca(), metrics[name])
+    plt.show()
 
-    ax1.set_ylabel('Stock Price in $')
-    ax2.set_ylabel('Dividends in $')
-    ax3.set_ylabel('P/E-Ratio')
-    ax4.set_ylabel('Total Return in %')
-    ax5.set_title('Price Correlation of Tickers')
-    ax6.set_ylabel('Annual Yield in %')
-    ax7.set_ylabel('Annual Volatility in %')
 
-    ax2.set_xticks(ax2.get_xticks()[::month_period], labels=[months[it%12] \
-                    for it in range(0,len(ax2.get_xticks()),month_period)])
-    ax1.axvspan(mdates.date2num(all_stock_prices.index[-12]),mdates.date2num(all_stock_prices.index[-1]), facecolor='green', alpha=0.2)
-    ax2.axvspan(ax2.get_xticks()[-3]+(ax2.get_xlim()[-1]-ax2.get_xticks()[-1]), \
-                ax2.get_xlim()[-1], facecolor='green', alpha=0.2)
-    ax3.axvspan(mdates.date2num(all_stock_peRatio.index[-2]), mdates.date2num(all_stock_peRatio.index[-1]), facecolor='green', alpha=0.2)
-    ax4.axvspan(mdates.date2num(all_total_return.index[-12]), mdates.date2num(all_total_return.index[-1]), facecolor='green', alpha=0.2)
-    ax6.axvspan(mdates.date2num(all_annual_yields.index[-2]),mdates.date2num(all_annual_yields.index[-1]), facecolor='green', alpha=0.2)
-    ax7.axvspan(mdates.date2num(all_annual_yields.index[-2]),mdates.date2num(all_annual_yields.index[-1]), facecolor='green', alpha=0.2)
-    plt.show()
+def create_plot_tickers(tickers: List[Ticker], syms: List[str], types:List[str], cache: PriceCache = price_cache):
+    # -> tickers are only kept for compatibility, all data is fetched by symbol through the cache and its provider
+    plot_ticker_metrics(compute_ticker_metrics(syms, types, cache))
 
 
 def etf_pos_overlap_plot(t10hold: List[pd.DataFrame], syms: List[str]):
-    # extract all 10 major holding positions Symbols and Percentage of ETF/fund
-    SYM_DF = pd.concat([pd.DataFrame(hold.T["SYM"].to_numpy(),columns=[sym]).T for sym,hold in zip(syms,t10hold)]).T
-    ASSETS_DF = pd.concat([pd.DataFrame(hold.T["Assets"].to_numpy(),columns=[sym]).T for sym,hold in zip(syms,t10hold)]).T
+    # sparse ETF x security matrix of the major holding positions Symbols and Percentage of ETF/fund
+    weights, _ = holdings_matrix([hold.T for hold in t10hold])
 
     # generate correlation matrix to see the overlap of the positions weighted by their fund impact 
-    Corr_Mat = pd.DataFrame()
-    for sym in syms:
-        row = dict()
-        total = np.sum(ASSETS_DF[sym].to_numpy())
-        for o_sym in syms:
-            num = 0
-            for ticker,perc in zip(SYM_DF[sym].to_list(),ASSETS_DF[sym].to_list()): 
-                if ticker in SYM_DF[o_sym].to_list(): 
-                    num += perc
-            row[o_sym] = num/total
-        Corr_Mat[sym] = (pd.Series(row)*100).round(2)
+    # -> column sym holds the share of its positions that every other ETF holds as well
+    Corr_Mat = pd.DataFrame((overlap_matrix(weights)*100).round(2).T, index=syms, columns=syms)
 
     # Plot Corr_Mat
     # -> row in plot are overlap percentages for 10 major holdings
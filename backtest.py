@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from sys import argv
+from typing import Dict, Optional, Sequence
+from indicators import multi_sma, rolling_quantiles
+from rules import ladder_rules, ladder_variables
+from signal_stream import LADDER_STEPS, M75_WINDOWS, STEP_EXPOSURE, STRATEGIES, VOL_FACTORS, signal_sma_windows
+
+
+# helper function to get the calendar dates of a DatetimeIndex (exchanges in different time zones share them)
+def bar_dates(index: pd.DatetimeIndex) -> np.ndarray:
+    if index.tz is not None: index = index.tz_localize(None)
+    return index.normalize().to_numpy()
+
+
+# Function to align values of another series to the given dates (its latest bar on or before each date, NaN before its start)
+def align_to(dates: np.ndarray, other_dates: np.ndarray, values: np.ndarray) -> np.ndarray:
+    idx = np.searchsorted(other_dates, dates, side="right")-1
+    aligned = np.take(values, np.maximum(idx, 0), axis=-1).astype(float)
+    aligned[..., idx < 0] = np.nan
+    return aligned
+
+
+# Function to precompute every array the decision ladder needs on the trading days of the ETF
+# -> SMAs are calculated for all sma_windows at once (include every period that will be evaluated),
+#    index and volatility bars are calculated on their own calendar and then aligned to the ETF days
+def prepare_signals(etf: pd.DataFrame, index: pd.DataFrame, vol: Optional[pd.DataFrame] = None,
+                    sma_windows: Sequence[int] = signal_sma_windows(50)) -> Dict[str, object]:
+    dates = bar_dates(etf.index)
+    etf_close = etf['Close'].to_numpy(dtype=float)
+    etf_smas, labels = multi_sma(etf_close, sma_windows)
+    index_close = index['Close'].to_numpy(dtype=float)
+    index_smas, _ = multi_sma(index_close, sma_windows)
+    index_dates = bar_dates(index.index)
+    signals = {"dates": etf.index, "labels": labels, "etf_close": etf_close, "etf_smas": etf_smas,
+               "index_close": align_to(dates, index_dates, index_close),
+               "index_smas": align_to(dates, index_dates, index_smas)}
+    if vol is not None:
+        vol_close = vol['Close'].to_numpy(dtype=float)
+        m75s, _ = rolling_quantiles(vol_close, M75_WINDOWS, [0.75])
+        vol_dates = bar_dates(vol.index)
+        signals["vol"] = align_to(dates, vol_dates, vol_close)
+        signals["m75s"] = align_to(dates, vol_dates, m75s)
+    return signals
+
+
+# Function to evaluate the decision ladder on every bar, returns (step numbers into LADDER_STEPS, add-to-position hints)
+# -> the compiled ladder of rules.py evaluates all bars (and instruments, if the arrays have more axes) in one pass
+def ladder_steps(signals: dict, sma_period: int, vol_thresh: Optional[float] = None,
+                 vol_factors: Sequence[float] = VOL_FACTORS):
+    rules = ladder_rules(sma_period, vol_thresh is not None, tuple(vol_factors))
+    steps, flags = rules.evaluate(ladder_variables(signals, sma_period, vol_thresh))
+    return steps, flags["add_hint"]
+
+
+# Function to get the first bar from which all indicators of a parameter set exist
+def first_valid(signals: dict, sma_period: int, vol_thresh: Optional[float] = None) -> int:
+    rows = [signals["labels"].index(f'SMA{window}') for window in signal_sma_windows(sma_period)]
+    valid = np.isfinite(signals["etf_smas"][rows]).all(axis=0) & np.isfinite(signals["index_smas"][rows]).all(axis=0)
+    if vol_thresh is not None: valid &= np.isfinite(signals["m75s"]).all(axis=0)
+    return int(np.argmax(valid)) if valid.any() else len(valid)
+
+
+# Function to turn ladder steps into the held exposure and the equity curves of the strategy and of buy-and-hold
+# -> a decision made with the closes of bar t sets the exposure for the return lag bars later
+#    (use lag=2 when the index closes after the ETF's exchange), cost is charged per unit of exposure traded
+def equity_curves(close: np.ndarray, steps: np.ndarray, exposures: Dict[str, float] = STEP_EXPOSURE,
+                  lag: int = 1, cost: float = 0.0):
+    returns = np.zeros(close.shape)
+    returns[..., 1:] = close[..., 1:]/close[..., :-1] - 1
+    target = np.array([exposures[step] for step in LADDER_STEPS])[steps]
+    exposure = np.ones(target.shape)
+    exposure[..., lag:] = target[..., :target.shape[-1]-lag]
+    turnover = np.abs(np.diff(exposure, axis=-1, prepend=exposure[..., :1]))
+    strategy = np.cumprod(1 + exposure*returns - cost*turnover, axis=-1)
+    return exposure, strategy, np.cumprod(1 + returns, axis=-1)
+
+
+# Function to get the largest relative loss from a previous high of equity curves (along the last axis)
+def max_drawdown(equity: np.ndarray) -> np.ndarray:
+    return (equity/np.maximum.accumulate(equity, axis=-1) - 1).min(axis=-1)
+
+
+# Function to backtest the check_signals ladder on every day of the ETF history
+# -> returns a DataFrame with the ladder step, hint, held exposure and both equity curves per day, starting at the
+#    first day all indicators exist
+def backtest_signals(etf: pd.DataFrame, index: pd.DataFrame, vol: Optional[pd.DataFrame] = None,
+                     vol_thresh: Optional[float] = None, sma_period: int = 50, vol_factors: Sequence[float] = VOL_FACTORS,
+                     exposures: Dict[str, float] = STEP_EXPOSURE, lag: int = 1, cost: float = 0.0) -> pd.DataFrame:
+    signals = prepare_signals(etf, index, vol if vol_thresh is not None else None, signal_sma_windows(sma_period))
+    steps, hint = ladder_steps(signals, sma_period, vol_thresh, vol_factors)
+    start = first_valid(signals, sma_period, vol_thresh)
+    close = signals["etf_close"][start:]
+    exposure, strategy, hold = equity_curves(close, steps[start:], exposures, lag, cost)
+    return pd.DataFrame({"Close": close, "Step": pd.Categorical.from_codes(steps[start:], LADDER_STEPS),
+                         "Hint": hint[start:], "Exposure": exposure, "Strategy": strategy, "BuyAndHold": hold},
+                        index=signals["dates"][start:])
+
+
+# Function to summarize a backtest (total return and max drawdown of the strategy and of buy-and-hold)
+def backtest_summary(result: pd.DataFrame) -> dict:
+    summary = dict()
+    for col in ("Strategy", "BuyAndHold"):
+        equity = result[col].to_numpy()
+        summary[col] = {"total_return": equity[-1]/equity[0]-1 if len(equity) else np.nan,
+                        "max_drawdown": max_drawdown(equity) if len(equity) else np.nan}
+    return summary
+
+
+# Main function
+def main(strategy, thresh=None, sma_period=None, period='25y'):
+    from market_data import price_cache
+    etf_sym, index_sym, vol_sym, default_thresh, default_period = STRATEGIES[strategy]
+    thresh = default_thresh if thresh is None else thresh
+    sma_period = default_period if sma_period is None else sma_period
+
+    etf = price_cache.history(etf_sym, '1d', period=period)
+    index = price_cache.history(index_sym, '1d', period=period)
+    vol = price_cache.history(vol_sym, '1d', period=period) if vol_sym else None
+    result = backtest_signals(etf, index, vol, thresh if vol_sym else None, sma_period)
+
+    print(result["Step"].value_counts().to_string(), "\n")
+    for col, stats in backtest_summary(result).items():
+        print("{:34s} {:>10.2f}%".format(f"{col} Total Return:", stats["total_return"]*100))
+        print("{:34s} {:>10.2f}%".format(f"{col} Max Drawdown:", stats["max_drawdown"]*100))
+
+
+# Run the script
+if __name__ == "__main__":
+    main(argv[1] if len(argv)>1 else "amumbo", float(argv[2]) if len(argv)>2 else None, int(argv[3]) if len(argv)>3 else None)
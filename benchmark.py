@@ -0,0 +1,232 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Optional, Tuple
+import synthetic_data as synth
+
+# Benchmark Settings
+REPEAT = 5                # timed runs per case, the fastest one counts
+TIME_TOLERANCE = 1.25     # slower than baseline*tolerance is reported as regression
+MEMORY_TOLERANCE = 1.10   # more peak memory than baseline*tolerance is reported as regression
+MIN_SECONDS = 1e-3        # faster cases are too noisy to flag
+
+
+''' Cases '''
+# every case gets the generated inputs of a size from its setup and runs fn(*inputs), setups run outside the timing
+def _regressor(months):
+    series = pd.Series(synth.price_history(months, "1mo", seed=1, tz=None)["Close"].to_numpy(),
+                       index=pd.date_range(end="2024-12-01", periods=months, freq="MS", name="Date"))
+    return (series, "Close")
+
+
+def _batch_regressor(tickers):
+    series = [pd.Series(synth.price_history(61, "1mo", seed=num, tz=None)["Close"].to_numpy(),
+                        index=pd.date_range(end="2024-12-01", periods=61, freq="MS", name="Date")) for num in range(tickers)]
+    return (series, ["Close"]*tickers)
+
+
+def _daily(days):
+    return (synth.price_history(days, "1d", seed=1), )
+
+
+def _signals(days):
+    frames = synth.price_histories(["18MF.DE", "^GSPC", "^VIX"], days, "1d", seed=1)
+    return (frames["^GSPC"], frames["18MF.DE"], frames["^VIX"], 28, 50)
+
+
+def _holdings(funds):
+    return (synth.etf_holdings(funds, 200, 20*funds, seed=1), )
+
+
+def _growth(paths):
+    pos = np.full(14, 10000.0)
+    divy = np.linspace(0, 5.5, 14)
+    alloc = np.full(14, 1/14)
+    return (35, pos, divy, alloc, alloc, 18000.0, np.linspace(4, 15, 14), np.full(14, 15.0), 1200.0, 0.74, 0.3, paths)
+
+
+def _ticker_metrics(tickers):
+    from market_data import PriceCache
+    symbols = [f"SYN{num}" for num in range(tickers)]
+    provider = synth.synthetic_provider(symbols)
+    return (symbols, ["ETF"]*tickers, PriceCache(tempfile.mkdtemp(prefix="invest_bench_"), provider))
+
+
+def _correlation(symbols):
+    frames = synth.price_histories([f"SYN{num}" for num in range(symbols)], 252, "1d", seed=1)
+    return (np.column_stack([frame["Close"].to_numpy() for frame in frames.values()]), )
+
+
+def _ladder(instruments):
+    from indicators import multi_sma
+    from signal_stream import signal_sma_windows
+    frames = synth.price_histories([f"SYN{num}" for num in range(instruments+1)], 1000, "1d", seed=1)
+    close = np.stack([frame["Close"].to_numpy() for frame in frames.values()])
+    smas, labels = multi_sma(close, signal_sma_windows(50))
+    vol = synth.volatility_index(1000, seed=1)["Close"].to_numpy()
+    return ({"labels": labels, "etf_close": close[1:], "etf_smas": smas[:, 1:], "index_close": close[0],
+             "index_smas": smas[:, 0], "vol": vol, "m75s": np.stack([vol]*3)}, )
+
+
+# helper functions importing the benchmarked code only when the case runs
+def _three_layer_linear_regressor(series, tag):
+    from backend import three_layer_linear_regressor
+    return three_layer_linear_regressor(series, tag)
+
+
+def _batch_three_layer_linear_regressor(series, tags):
+    from backend import batch_three_layer_linear_regressor
+    return batch_three_layer_linear_regressor(series, tags)
+
+
+def _calculate_m75(data):
+    from amumbo_strat_helper import calculate_m75
+    return calculate_m75(data.copy(), 30)
+
+
+def _check_signals(index, etf, vol, vol_thresh, sma_period):
+    from amumbo_strat_helper import check_signals
+    with contextlib.redirect_stdout(io.StringIO()):
+        return check_signals(index.copy(), etf.copy(), vol.copy(), vol_thresh, sma_period)
+
+
+def _etf_overlap(holdings):
+    from holdings import holdings_matrix, overlap_matrix
+    return overlap_matrix(holdings_matrix(holdings)[0])
+
+
+def _monte_carlo_growth(years, pos, divy, DRIP_alloc, save_alloc, ysr, expGrowth, vol, taxFreeGain, afterTaxMult, corr, paths):
+    from portfolio_engine import monte_carlo_growth
+    return monte_carlo_growth(years, pos, divy, DRIP_alloc, save_alloc, ysr, expGrowth, vol, taxFreeGain, afterTaxMult,
+                              corr, paths, seed=1)
+
+
+def _compute_ticker_metrics(syms, types, cache):
+    from backend import compute_ticker_metrics
+    return compute_ticker_metrics(syms, types, cache)
+
+
+def _correlation_matrix(prices):
+    from correlation import correlation_matrix
+    return correlation_matrix(prices)
+
+
+def _ladder_steps(signals):
+    from backtest import ladder_steps
+    return ladder_steps(signals, 50, 28)
+
+
+# name -> (setup(size) -> inputs, fn, sizes of a full run), the first size is the one of a quick run
+CASES: Dict[str, Tuple[Callable, Callable, List[int]]] = {
+    "three_layer_linear_regressor": (_regressor, _three_layer_linear_regressor, [61, 240]),
+    "batch_three_layer_linear_regressor": (_batch_regressor, _batch_three_layer_linear_regressor, [20, 500]),
+    "calculate_m75": (_daily, _calculate_m75, [500, 6000]),
+    "check_signals": (_signals, _check_signals, [500, 6000]),
+    "etf_overlap": (_holdings, _etf_overlap, [20, 300]),
+    "monte_carlo_growth": (_growth, _monte_carlo_growth, [1000, 100_000]),
+    "compute_ticker_metrics": (_ticker_metrics, _compute_ticker_metrics, [10, 100]),  # warm local caches
+    "correlation_matrix": (_correlation, _correlation_matrix, [100, 2000]),
+    "ladder_steps": (_ladder, _ladder_steps, [20, 2000]),  # instruments x 1000 days in one pass
+}
+
+
+''' Measuring '''
+# Function to measure one case, returns the best of repeat wall times and the peak traced memory in MB
+# -> memory is traced in an extra run, as tracing slows numpy-heavy code down
+def measure(fn: Callable, inputs: tuple, repeat: int = REPEAT) -> dict:
+    fn(*inputs)  # warm up (imports, caches)
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*inputs)
+        times.append(time.perf_counter()-start)
+    tracemalloc.start()
+    try:
+        fn(*inputs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "median_seconds": float(np.median(times)), "peak_mb": peak/2**20}
+
+
+# Function to run the cases (all by default) at their sizes, returns one row per case and size
+def run(cases: Optional[List[str]] = None, quick: bool = False, repeat: int = REPEAT) -> pd.DataFrame:
+    rows = list()
+    for name in cases or CASES:
+        setup, fn, sizes = CASES[name]
+        for size in sizes[:1] if quick else sizes:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                result = measure(fn, setup(size), repeat)
+            rows.append({"case": name, "size": size, **result})
+            print(f"{name:<36}{size:>8}  {result['seconds']*1000:10.2f} ms  {result['peak_mb']:9.2f} MB", flush=True)
+    return pd.DataFrame(rows)
+
+
+''' Baselines '''
+# Function to store results as baseline (JSON with the machine they were measured on)
+def save_baseline(results: pd.DataFrame, path: str):
+    data = {"created": datetime.now().isoformat(timespec="seconds"), "machine": platform.platform(),
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "results": results.to_dict(orient="records")}
+    with open(path+".tmp", "w") as f: json.dump(data, f, indent=1)
+    os.replace(path+".tmp", path)
+
+
+def load_baseline(path: str) -> pd.DataFrame:
+    with open(path) as f: return pd.DataFrame(json.load(f)["results"])
+
+
+# Function to compare results against a baseline per case and size
+# -> ratios are new/baseline, status is 'slower', 'more memory', 'faster', 'new' or empty (within tolerance)
+def compare(results: pd.DataFrame, baseline: pd.DataFrame, time_tolerance: float = TIME_TOLERANCE,
+            memory_tolerance: float = MEMORY_TOLERANCE) -> pd.DataFrame:
+    table = results.merge(baseline[["case", "size", "seconds", "peak_mb"]], on=["case", "size"], how="left",
+                          suffixes=("", "_baseline"))
+    table["time_ratio"] = table["seconds"]/table["seconds_baseline"]
+    table["memory_ratio"] = table["peak_mb"]/table["peak_mb_baseline"]
+    timed = np.maximum(table["seconds"], table["seconds_baseline"]) >= MIN_SECONDS
+    status = np.select([table["seconds_baseline"].isna(), timed & (table["time_ratio"] > time_tolerance),
+                        table["memory_ratio"] > memory_tolerance, timed & (table["time_ratio"] < 1/time_tolerance)],
+                       ["new", "slower", "more memory", "faster"], "")
+    table["status"] = status
+    return table[["case", "size", "seconds_baseline", "seconds", "time_ratio", "peak_mb_baseline", "peak_mb",
+                  "memory_ratio", "status"]]
+
+
+# Main function
+# -> exits with 1 if a case got slower or needs more memory than the baseline allows
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks on synthetic market data")
+    parser.add_argument("cases", nargs="*", help=f"cases to run (default: all of {', '.join(CASES)})")
+    parser.add_argument("--quick", action="store_true", help="only the smallest size of every case")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="timed runs per case")
+    parser.add_argument("--save", metavar="PATH", help="store the results as baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results against a stored baseline")
+    options = parser.parse_args(args)
+    unknown = [name for name in options.cases if name not in CASES]
+    if unknown: parser.error(f"unknown cases {unknown}")
+
+    results = run(options.cases or None, options.quick, options.repeat)
+    if options.save: save_baseline(results, options.save)
+    if not options.compare: return 0
+
+    table = compare(results, load_baseline(options.compare))
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.4g}".format):
+        print("\n", table.to_string(index=False))
+    return int(table["status"].isin(["slower", "more memory"]).any())
+
+
+# Run the script
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,125 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import matplotlib.cm as cm
+import matplotlib.dates as mdates
+from matplotlib.colors import Normalize
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from typing import Dict, Optional
+
+months = ['Jan','Feb','Mar','Apr','Mai','Jun','Jul','Aug','Sep','Oct','Nov','Dec']
+
+# Dividend Settings
+month_period = 6
+
+# Render Settings
+CHART_SIZE = (10, 8)
+RENDER_VERSION = 2  # part of the image hash, increase when the drawing code changes so cached images are redrawn
+
+
+''' Chart Drawing '''
+# every chart is drawn onto a given figure and axes, so the same code serves interactive and headless rendering
+def draw_prices(fig, ax, all_stock_prices: pd.DataFrame):
+    all_stock_prices.plot.line(ax=ax)
+    ax.set_ylabel('Stock Price in $')
+    ax.axvspan(mdates.date2num(all_stock_prices.index[-12]),mdates.date2num(all_stock_prices.index[-1]), facecolor='green', alpha=0.2)
+
+
+def draw_dividends(fig, ax, all_dividends: pd.DataFrame):
+    all_dividends.plot.bar(ax=ax,stacked=True)
+    ax.set_ylabel('Dividends in $')
+    ax.set_xticks(ax.get_xticks()[::month_period], labels=[months[it%12] \
+                  for it in range(0,len(ax.get_xticks()),month_period)])
+    ax.axvspan(ax.get_xticks()[-3]+(ax.get_xlim()[-1]-ax.get_xticks()[-1]), \
+               ax.get_xlim()[-1], facecolor='green', alpha=0.2)
+
+
+def draw_pe_ratio(fig, ax, all_stock_peRatio: pd.DataFrame):
+    all_stock_peRatio.plot.line(ax=ax)
+    ax.set_ylabel('P/E-Ratio')
+    ax.axvspan(mdates.date2num(all_stock_peRatio.index[-2]), mdates.date2num(all_stock_peRatio.index[-1]), facecolor='green', alpha=0.2)
+
+
+def draw_total_return(fig, ax, all_total_return: pd.DataFrame):
+    all_total_return.plot.line(ax=ax)
+    ax.set_ylabel('Total Return in %')
+    ax.axvspan(mdates.date2num(all_total_return.index[-12]), mdates.date2num(all_total_return.index[-1]), facecolor='green', alpha=0.2)
+
+
+def draw_correlation(fig, ax, corr_mat: pd.DataFrame):
+    ax.imshow(corr_mat,cmap=cm.get_cmap('jet'),norm=Normalize(vmin=-100,vmax=100))
+    for i,col in enumerate(corr_mat.columns):
+        for j,row in enumerate(corr_mat.index):
+            if -50<corr_mat[col].loc[row]<90:
+                ax.text(j, i, corr_mat[col].loc[row], ha="center", va="center", color="k")
+            else:
+                ax.text(j, i, corr_mat[col].loc[row], ha="center", va="center", color="w")
+    ax.set_xticks([*range(len(corr_mat.index))],labels=corr_mat.index)
+    ax.set_yticks([*range(len(corr_mat.columns))],labels=corr_mat.columns)
+    fig.colorbar(cm.ScalarMappable(norm=Normalize(vmin=-100,vmax=100), cmap=cm.get_cmap('jet')), ax=ax)
+    ax.set_title('Log Return Correlation of Tickers')
+
+
+def draw_annual_yields(fig, ax, all_annual_yields: pd.DataFrame):
+    all_annual_yields.plot.line(ax=ax)
+    ax.set_ylabel('Annual Yield in %')
+    ax.axvspan(mdates.date2num(all_annual_yields.index[-2]),mdates.date2num(all_annual_yields.index[-1]), facecolor='green', alpha=0.2)
+
+
+def draw_annual_volatility(fig, ax, all_annual_volatility: pd.DataFrame):
+    all_annual_volatility.plot.line(ax=ax)
+    ax.set_ylabel('Annual Volatility in %')
+    ax.axvspan(mdates.date2num(all_annual_volatility.index[-2]),mdates.date2num(all_annual_volatility.index[-1]), facecolor='green', alpha=0.2)
+
+
+# Charts of create_plot_tickers in figure order, keyed like the metrics of compute_ticker_metrics
+CHARTS = {"prices": draw_prices,
+          "dividends": draw_dividends,
+          "pe_ratio": draw_pe_ratio,
+          "total_return": draw_total_return,
+          "correlation": draw_correlation,
+          "annual_yields": draw_annual_yields,
+          "annual_volatility": draw_annual_volatility}
+
+
+''' Headless Rendering '''
+# Function to hash the input data of a chart (values, index and columns), equal data gives the same file name
+def chart_hash(name: str, data: pd.DataFrame, fmt: str) -> str:
+    digest = hashlib.sha256(f"{name}|{fmt}|{RENDER_VERSION}|".encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    digest.update(repr(list(data.columns)).encode())
+    return digest.hexdigest()[:20]
+
+
+# helper function to draw one chart with the Agg canvas (no pyplot, so it works in any process and without display)
+def _render(name: str, data: pd.DataFrame, path: str) -> str:
+    fig = Figure(figsize=CHART_SIZE)
+    FigureCanvasAgg(fig)
+    CHARTS[name](fig, fig.gca(), data)
+    fig.savefig(path+".tmp", format=os.path.splitext(path)[1][1:])
+    os.replace(path+".tmp", path)
+    return path
+
+
+# Function to write the charts of several reports {report: metrics} as image files on a process pool
+# -> file names carry the hash of the chart data, charts whose file already exists are not drawn again,
+#    returns {report: {chart: path}}
+def render_charts(reports: Dict[str, dict], out_dir: str, fmt: str = "png", max_workers: Optional[int] = None) -> dict:
+    os.makedirs(out_dir, exist_ok=True)
+    paths, jobs = dict(), list()
+    for report, metrics in reports.items():
+        paths[report] = dict()
+        for name in CHARTS:
+            if name not in metrics: continue
+            path = os.path.join(out_dir, f"{report}_{name}_{chart_hash(name, metrics[name], fmt)}.{fmt}")
+            paths[report][name] = path
+            if not os.path.exists(path): jobs.append((name, metrics[name], path))
+
+    if len(jobs) == 1: _render(*jobs[0])
+    elif jobs:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for future in [pool.submit(_render, *job) for job in jobs]: future.result()
+    return paths
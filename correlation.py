@@ -0,0 +1,137 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+from typing import Optional, Sequence
+
+# Block Settings
+BLOCK = 512  # symbols per block of the blocked products
+
+
+# Function to get the log returns of prices (bars x symbols), the first bar is dropped
+def log_returns(prices) -> np.ndarray:
+    prices = np.asarray(prices, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(prices), axis=0)
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+# Function to standardize returns per symbol (zero mean, unit norm) so correlations are plain dot products
+# -> missing returns count as the mean of their symbol, constant symbols stay all zero (correlation 0)
+def standardize(returns: np.ndarray, dtype=np.float32) -> np.ndarray:
+    centred = returns - np.nanmean(returns, axis=0)
+    centred[np.isnan(centred)] = 0.0
+    norm = np.sqrt((centred**2).sum(axis=0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(norm>0, centred/norm, 0.0).astype(dtype)
+
+
+# Function to get the Pearson correlation matrix of log returns computed in column blocks
+# -> in float32 a 3000 symbol matrix needs 36MB and only one (bars x block) slice is multiplied at a time
+def correlation_matrix(prices, dtype=np.float32, block: int = BLOCK) -> np.ndarray:
+    z = standardize(log_returns(prices), dtype)
+    n = z.shape[1]
+    corr = np.empty((n, n), dtype=dtype)
+    for lo in range(0, n, block):
+        hi = min(lo+block, n)
+        corr[lo:hi, lo:] = z[:, lo:hi].T @ z[:, lo:]
+        corr[lo:, lo:hi] = corr[lo:hi, lo:].T
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+# Function to get the correlations of log returns as DataFrame in % like create_plot_tickers shows them
+def return_correlation(prices: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame(correlation_matrix(prices, np.float64)*100, index=prices.columns, columns=prices.columns).round(2)
+
+
+# Function to find the k most correlated symbol pairs without building the full matrix
+# -> blocks of the upper triangle are searched one after another and only the best k candidates are kept,
+#    absolute ranks by |correlation| (e.g. to find hedges as well), returns a table of pairs sorted by rank
+def top_k_pairs(prices, symbols: Sequence[str], k: int = 50, absolute: bool = False, dtype=np.float32,
+                block: int = BLOCK) -> pd.DataFrame:
+    z = standardize(log_returns(prices), dtype)
+    n = z.shape[1]
+    best_i, best_j, best_c = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=dtype)
+    for lo in range(0, n, block):
+        hi = min(lo+block, n)
+        corr = z[:, lo:hi].T @ z[:, lo:]
+        rows, cols = np.nonzero(np.triu(np.ones(corr.shape, dtype=bool), k=1))
+        values = corr[rows, cols]
+        keys = np.abs(values) if absolute else values
+        if len(values) > k:
+            keep = np.argpartition(-keys, k-1)[:k]
+            rows, cols, values = rows[keep], cols[keep], values[keep]
+        best_i, best_j = np.concatenate([best_i, rows+lo]), np.concatenate([best_j, cols+lo])
+        best_c = np.concatenate([best_c, values])
+        if len(best_c) > k:
+            keep = np.argpartition(-(np.abs(best_c) if absolute else best_c), k-1)[:k]
+            best_i, best_j, best_c = best_i[keep], best_j[keep], best_c[keep]
+
+    order = np.argsort(-(np.abs(best_c) if absolute else best_c), kind="stable")
+    symbols = np.asarray(symbols, dtype=object)
+    return pd.DataFrame({"symbol_a": symbols[best_i[order]], "symbol_b": symbols[best_j[order]],
+                         "correlation": best_c[order].astype(np.float64)})
+
+
+# Rolling correlation matrix of log returns updated one bar at a time
+# -> keeps the cross-products of the last window returns, so every new bar costs one rank-one update instead of
+#    recomputing the whole window, they are rebuilt exactly once per window against rounding drift
+# -> missing returns count as the window mean of their symbol and constant symbols have correlation 0 like in
+#    standardize, so the matrix equals correlation_matrix of the window's returns
+class RollingCorrelation:
+    def __init__(self, symbols: int, window: int, dtype=np.float64):
+        self.window = window
+        self.recent = deque(maxlen=window)
+        self.cross = np.zeros((symbols, symbols), dtype=dtype)   # [i, j] sum of products of returns (missing as 0)
+        self.mixed = np.zeros((symbols, symbols), dtype=dtype)   # [i, j] sum of returns of i on bars j is present
+        self.pairs = np.zeros((symbols, symbols), dtype=dtype)   # [i, j] number of bars both are present
+        self.steps = 0
+
+    # helper function to add (sign 1) or remove (sign -1) the rank-one terms of a bar
+    def _add(self, row: np.ndarray, sign: float):
+        present = ~np.isnan(row)
+        values, mask = np.where(present, row, 0.0), present.astype(self.cross.dtype)
+        self.cross += sign*np.outer(values, values)
+        self.mixed += sign*np.outer(values, mask)
+        self.pairs += sign*np.outer(mask, mask)
+
+    # Function to add the returns of the next bar (one per symbol, NaN if missing)
+    def update(self, returns: Sequence[float]):
+        row = np.asarray(returns, dtype=self.cross.dtype)
+        if len(self.recent) == self.window: self._add(self.recent[0], -1.0)
+        self.recent.append(row)
+        self._add(row, 1.0)
+        self.steps += 1
+        if self.steps >= self.window: self._rebuild()
+
+    def _rebuild(self):
+        rows = np.array(self.recent)
+        present = ~np.isnan(rows)
+        values, mask = np.where(present, rows, 0.0), present.astype(self.cross.dtype)
+        self.cross = values.T @ values
+        self.mixed = values.T @ mask
+        self.pairs = mask.T @ mask
+        self.steps = 0
+
+    # Function to get the correlation matrix of the current window (NaN until it is full)
+    def matrix(self) -> np.ndarray:
+        if len(self.recent) < self.window: return np.full(self.cross.shape, np.nan)
+        counts = np.diag(self.pairs)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = np.where(counts > 0, np.diag(self.mixed)/counts, 0.0)
+            # products of the returns minus their means over the bars both symbols are present
+            cov = self.cross - self.mixed*means - self.mixed.T*means[:, None] + self.pairs*np.outer(means, means)
+            std = np.sqrt(np.clip(np.diag(cov), 0, None))
+            corr = np.where(np.outer(std, std) > 0, cov/np.outer(std, std), 0.0)
+        np.fill_diagonal(corr, 1.0)
+        return corr
+
+
+# Function to get the rolling correlation matrices of prices (bars x symbols) for every bar after the first window
+def rolling_correlations(prices, window: int, dtype=np.float64):
+    returns = log_returns(prices)
+    rolling = RollingCorrelation(returns.shape[1], window, dtype)
+    for idx, row in enumerate(returns):
+        rolling.update(row)
+        if idx+1 >= window: yield idx+1, rolling.matrix()
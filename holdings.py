@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from typing import List, Optional, Sequence, Tuple
+
+
+# Interned symbols: every symbol gets a stable column number the first time it is seen
+class SymbolIndex:
+    def __init__(self, symbols: Sequence[str] = ()):
+        self.ids = dict()
+        self.symbols = list()
+        if len(symbols): self.intern(symbols)
+
+    def __len__(self): return len(self.symbols)
+
+    # Function to get the column numbers of symbols, unknown symbols are appended
+    # -> missing symbols (NaN/None, e.g. blank CSV cells) count as the symbol 'Unknown' like in LookThrough
+    def intern(self, symbols: Sequence[str]) -> np.ndarray:
+        codes, uniques = pd.factorize(pd.Series(np.asarray(symbols, dtype=object), dtype=object).fillna("Unknown"))
+        ids = np.empty(len(uniques), dtype=np.int64)
+        for num, symbol in enumerate(uniques):
+            idx = self.ids.get(symbol)
+            if idx is None:
+                idx = self.ids[symbol] = len(self.symbols)
+                self.symbols.append(symbol)
+            ids[num] = idx
+        return ids[codes]
+
+
+# Function to build the sparse (funds x securities) matrix of holding weights
+# -> holdings are DataFrames with the columns 'SYM' and 'Assets' (weight in % of the fund), a symbol listed
+#    twice in a fund adds up, returns the matrix and the symbol index of its columns
+def holdings_matrix(holdings: List[pd.DataFrame], index: Optional[SymbolIndex] = None) -> Tuple[sparse.csr_matrix, SymbolIndex]:
+    index = index if index is not None else SymbolIndex()
+    sizes = [len(hold) for hold in holdings]
+    rows = np.repeat(np.arange(len(holdings)), sizes)
+    cols = index.intern(np.concatenate([hold["SYM"].to_numpy(dtype=object) for hold in holdings]) if holdings else [])
+    weights = np.concatenate([hold["Assets"].to_numpy(dtype=float) for hold in holdings]) if holdings else []
+    matrix = sparse.csr_matrix((weights, (rows, cols)), shape=(len(holdings), len(index)))
+    matrix.sum_duplicates()
+    return matrix, index
+
+
+# Function to get the weighted overlap of all fund pairs in one sparse product
+# -> entry [i, j] is the share of fund i's listed weight in securities that fund j holds as well
+def overlap_matrix(weights: sparse.csr_matrix) -> np.ndarray:
+    membership = weights.copy()
+    membership.data[:] = 1.0  # explicitly listed holdings count even at zero weight
+    shared = (weights @ membership.T).toarray()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return shared / np.asarray(weights.sum(axis=1))
+
+
+# Portfolio look-through: exposure of all positions to securities, sectors and countries via the funds' holdings
+# -> holdings are DataFrames with 'SYM' and 'Assets' (weight in % of the fund) and optionally further level columns
+#    like 'Sector' and 'Country' (missing ones count as 'Unknown'), a directly held stock is a fund holding itself
+#    at 100%, exposures are in the currency of the positions and changing one position or the holdings of one fund
+#    only adds the difference of that fund's rows instead of aggregating everything again
+class LookThrough:
+    def __init__(self, levels: Sequence[str] = ("SYM", "Sector", "Country")):
+        self.levels = list(levels)
+        self.indices = {level: SymbolIndex() for level in self.levels}
+        self.exposure = {level: np.zeros(0) for level in self.levels}
+        self.funds = dict()      # fund -> {level: (ids, weights in %)}
+        self.positions = dict()  # fund -> position value
+
+    # helper function to add the holdings of a fund scaled by value to the exposures
+    def _add(self, fund: str, value: float):
+        if not value or fund not in self.funds: return
+        for level, (ids, weights) in self.funds[fund].items():
+            size = len(self.indices[level])
+            exposure = self.exposure[level]
+            if len(exposure) < size: exposure = self.exposure[level] = np.pad(exposure, (0, size-len(exposure)))
+            exposure += np.bincount(ids, weights=weights*value/100, minlength=size)
+
+    # Function to set or replace the holdings of a fund
+    def set_holdings(self, fund: str, holdings: pd.DataFrame):
+        value = self.positions.get(fund, 0.0)
+        self._add(fund, -value)
+        weights = holdings["Assets"].to_numpy(dtype=float)
+        self.funds[fund] = {level: (self.indices[level].intern(holdings[level].fillna("Unknown").to_numpy(dtype=object)
+                                                               if level in holdings else ["Unknown"]*len(holdings)), weights)
+                            for level in self.levels}
+        self._add(fund, value)
+
+    # Function to set the position value of a fund (0 removes it)
+    def set_position(self, fund: str, value: float):
+        self._add(fund, value-self.positions.get(fund, 0.0))
+        self.positions[fund] = value
+
+    # Function to recompute all exposures from scratch in one sparse product (e.g. to drop accumulated rounding)
+    def rebuild(self):
+        funds = [fund for fund in self.funds if self.positions.get(fund)]
+        values = np.array([self.positions[fund] for fund in funds], dtype=float)
+        for level in self.levels:
+            parts = [self.funds[fund][level] for fund in funds]
+            rows = np.repeat(np.arange(len(funds)), [len(ids) for ids, _ in parts])
+            cols = np.concatenate([ids for ids, _ in parts]) if parts else np.zeros(0, dtype=np.int64)
+            data = np.concatenate([weights for _, weights in parts]) if parts else np.zeros(0)
+            matrix = sparse.csr_matrix((data/100, (rows, cols)), shape=(len(funds), len(self.indices[level])))
+            self.exposure[level] = matrix.T @ values
+
+    # Function to get the exposure of the portfolio per entry of a level, largest first
+    def exposures(self, level: str = "SYM") -> pd.Series:
+        exposure = self.exposure[level]
+        series = pd.Series(exposure, index=self.indices[level].symbols[:len(exposure)], name=level)
+        return series[series != 0].sort_values(ascending=False)
+
+    # Function to get the share of the portfolio value covered by the listed holdings
+    def coverage(self) -> float:
+        total = sum(self.positions.values())
+        return self.exposure[self.levels[0]].sum()/total if total else np.nan
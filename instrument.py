@@ -0,0 +1,217 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from typing import Callable, Deque, Dict, List, Optional
+
+# Set INVEST_TOOL_TRACE to a path prefix to record every run and write <prefix>.json and <prefix>.prom at exit
+TRACE_ENV = "INVEST_TOOL_TRACE"
+METRIC_PREFIX = "invest_tool_stage"
+MAX_SPANS = 10000  # latest spans kept for spans()/export_json, totals cover all spans since the last reset
+
+_enabled = False
+_memory = False
+_tracing = False  # tracemalloc was started by enable and is stopped by disable
+_spans: Deque[dict] = deque(maxlen=MAX_SPANS)
+_totals: Dict[tuple, dict] = dict()  # running sums per (stage, ticker, labels), see totals()
+_opened = 0  # spans opened since the last reset (ids)
+_lock = threading.Lock()
+_local = threading.local()
+
+
+# Function to start recording spans, memory additionally traces allocations (slows numpy-heavy code down a bit)
+# -> only the latest max_spans spans are kept, so long running processes (e.g. with INVEST_TOOL_TRACE) stay bounded
+def enable(memory: bool = False, max_spans: int = MAX_SPANS):
+    global _enabled, _memory, _tracing, _spans
+    _memory = memory
+    if max_spans != _spans.maxlen:
+        with _lock: _spans = deque(_spans, maxlen=max_spans)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _tracing = True
+    _enabled = True
+
+
+def disable():
+    global _enabled, _tracing
+    _enabled = False
+    if _tracing: tracemalloc.stop()
+    _tracing = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+# Function to drop all recorded spans and totals
+def reset():
+    global _opened
+    with _lock:
+        _spans.clear()
+        _totals.clear()
+        _opened = 0
+
+
+# Span of a stage (optionally of one ticker and further labels), spans opened inside another span of the same
+# thread are its children
+# -> records wall time, CPU time of the thread and (with memory tracing) the change of allocated bytes
+class _Span:
+    __slots__ = ("record", "start", "cpu", "alloc", "outer")
+
+    def __init__(self, stage: str, ticker: Optional[str], labels: dict, outer: Optional[dict] = None):
+        self.record = {"stage": stage, "ticker": ticker, "labels": labels}
+        self.outer = outer  # parent for spans starting a thread's stack (e.g. requests of a thread pool)
+
+    def __enter__(self):
+        global _opened
+        stack = _local.__dict__.setdefault("stack", list())
+        parent = stack[-1] if stack else self.outer
+        self.record["parent"] = parent["id"] if parent else None
+        self.record["depth"] = parent["depth"]+1 if parent else 0
+        with _lock:
+            self.record["id"] = _opened
+            _opened += 1
+            _spans.append(self.record)
+        stack.append(self.record)
+        self.alloc = tracemalloc.get_traced_memory()[0] if _memory and tracemalloc.is_tracing() else None
+        self.cpu = time.thread_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record["wall"] = time.perf_counter()-self.start
+        self.record["cpu"] = time.thread_time()-self.cpu
+        self.record["alloc"] = tracemalloc.get_traced_memory()[0]-self.alloc if self.alloc is not None and tracemalloc.is_tracing() else None
+        self.record["error"] = exc_type.__name__ if exc_type else None
+        _local.stack.pop()
+        _add_total(self.record)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc, tb): return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+# Function to open a span: with span("regression", ticker="SPY"): ... (further labels like chart="PE" are kept apart
+# in totals and exports, so only use labels with few values)
+# -> while disabled the same empty context is returned every time, so the cost is one function call
+def span(stage: str, ticker: Optional[str] = None, **labels):
+    if not _enabled: return _NO_SPAN
+    return _Span(stage, ticker, labels)
+
+
+# Decorator recording every call of a function as span of a stage (the function name by default)
+def instrumented(stage: Optional[str] = None) -> Callable:
+    def decorate(fn):
+        name = stage or fn.__name__
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled: return fn(*args, **kwargs)
+            with _Span(name, None, dict()): return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Function to wrap fn so every call runs inside a span (e.g. requests handed to a thread pool), fn itself if disabled
+# -> the span open when wrapping becomes the parent of these spans, even in another thread
+def traced(stage: str, ticker: Optional[str], fn: Callable) -> Callable:
+    if not _enabled: return fn
+    stack = _local.__dict__.get("stack")
+    outer = stack[-1] if stack else None
+    def wrapper(*args, **kwargs):
+        with _Span(stage, ticker, dict(), outer): return fn(*args, **kwargs)
+    return wrapper
+
+
+''' Export '''
+# Function to get a copy of the kept finished spans in the order they were opened
+def spans() -> List[dict]:
+    with _lock: return [dict(record) for record in _spans if "wall" in record]
+
+
+# helper function to add a finished span to the running totals
+def _add_total(record: dict):
+    key = (record["stage"], record["ticker"], tuple(sorted(record["labels"].items())))
+    with _lock:
+        entry = _totals.get(key)
+        if entry is None: entry = _totals[key] = {"calls": 0, "wall": 0.0, "cpu": 0.0, "alloc": 0, "max_wall": 0.0, "errors": 0}
+        entry["calls"] += 1
+        entry["wall"] += record["wall"]
+        entry["cpu"] += record["cpu"]
+        entry["alloc"] += record["alloc"] or 0
+        entry["max_wall"] = max(entry["max_wall"], record["wall"])
+        entry["errors"] += record["error"] is not None
+
+
+# Function to get the sums of all finished spans per stage, ticker and further labels (also of spans no longer kept)
+# -> returns {(stage, ticker, ((label, value), ...)): {calls, wall, cpu, alloc, max_wall, errors}}, labels sorted by name
+def totals() -> Dict[tuple, dict]:
+    with _lock: return {key: dict(entry) for key, entry in _totals.items()}
+
+
+# helper function to write a file atomically
+def _write(path: str, text: str):
+    with open(path+".tmp", "w") as f: f.write(text)
+    os.replace(path+".tmp", path)
+
+
+# Function to write the kept spans (with their parent ids, so the nesting can be rebuilt) as JSON
+# -> dropped is the number of older spans no longer kept (their parents may be missing)
+def export_json(path: str):
+    kept = spans()
+    with _lock: dropped = _opened-len(_spans)
+    _write(path, json.dumps({"created": time.time(), "dropped": dropped, "spans": kept}, indent=1))
+
+
+# helper function to escape a Prometheus label value
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Function to get the totals per stage, ticker and further labels in the Prometheus text format (e.g. for the node
+# exporter's textfile collector), stages without ticker have an empty ticker label
+def prometheus_text(prefix: str = METRIC_PREFIX) -> str:
+    metrics = [("calls", "counter", "Number of finished spans", "calls"),
+               ("seconds", "counter", "Wall time spent in the stage", "wall"),
+               ("cpu_seconds", "counter", "CPU time of the thread spent in the stage", "cpu"),
+               ("max_seconds", "gauge", "Longest single span of the stage", "max_wall"),
+               ("alloc_bytes", "gauge", "Net allocated bytes of the stage (with memory tracing)", "alloc"),
+               ("errors", "counter", "Spans left by an exception", "errors")]
+    table = totals()
+    lines = list()
+    for name, kind, help_text, key in metrics:
+        lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} {kind}"]
+        for (stage, ticker, labels), entry in sorted(table.items(), key=lambda item: (item[0][0], item[0][1] or "", str(item[0][2]))):
+            extra = "".join(f',{label}="{_label(value)}"' for label, value in labels)
+            lines.append(f'{prefix}_{name}{{stage="{_label(stage)}",ticker="{_label(ticker or "")}"{extra}}} {entry[key]:.6g}')
+    return "\n".join(lines)+"\n"
+
+
+def export_prometheus(path: str, prefix: str = METRIC_PREFIX):
+    _write(path, prometheus_text(prefix))
+
+
+# Function to print the totals per stage (summed over tickers) sorted by wall time
+def report():
+    stages = defaultdict(lambda: [0, 0.0, 0.0])
+    for (stage, _, _), entry in totals().items():
+        stages[stage][0] += entry["calls"]
+        stages[stage][1] += entry["wall"]
+        stages[stage][2] += entry["cpu"]
+    for stage, (calls, wall, cpu) in sorted(stages.items(), key=lambda item: -item[1][1]):
+        print(f"{stage:<32}{calls:>6} calls  {wall*1000:10.1f} ms wall  {cpu*1000:10.1f} ms cpu")
+
+
+# record and export every run when the environment asks for it (e.g. runs started by a scheduler)
+if os.environ.get(TRACE_ENV):
+    enable(memory=True)
+    atexit.register(lambda prefix=os.environ[TRACE_ENV]: (export_json(prefix+".json"), export_prometheus(prefix+".prom")))
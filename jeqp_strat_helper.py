@@ -1,8 +1,9 @@
-import yfinance as yf
+from market_data import price_cache
+from instrument import instrumented, span
+from indicators import multi_sma, rolling_quantiles
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import matplotlib.pyplot as plt
 from sys import argv
 
 # On Linux or with different python version the commented out code might be needed!
@@ -25,17 +26,17 @@ VXN_M75_COLORS = ["gold",
 
 # Function to get VXN data
 def get_vxn_data():
-    vxn = yf.download('^VXN', period='2y', interval='1d')
+    vxn = price_cache.history('^VXN', '1d', period='2y').copy()  # copy as indicator columns get added
     return vxn
 
 # Function to get Nasdaq 100 data
 def get_nasdaq100_data():
-    ndx100 = yf.download('^NDX', period='2y', interval='1d')
+    ndx100 = price_cache.history('^NDX', '1d', period='2y').copy()  # copy as indicator columns get added
     return ndx100
 
 # Function to get NDX Covered Call ETF data
 def get_jeqp_data():
-    jeqp = yf.download('JEQP.DE', period='2y', interval='1d')
+    jeqp = price_cache.history('JEQP.DE', '1d', period='2y').copy()  # copy as indicator columns get added
     return jeqp
 
 # Function to calculate Simple Moving Average
@@ -44,18 +45,29 @@ def calculate_sma(data, smaPeriod):
     return data
 def calculate_sma200(data): return calculate_sma(data, 200)
 
+# Function to calculate the Simple Moving Averages of several periods in one pass
+@instrumented()
+def calculate_smas(data, smaPeriods, dtype=np.float64):
+    smas, labels = multi_sma(data['Close'].to_numpy(), smaPeriods, dtype)
+    data[labels] = smas.T
+    return data
+
 # Function to calculate Moving 75%-ile
-def calculate_m75(data, m75Period):
-    data[f'M75_{m75Period}'] = data['Close'].rolling(window=m75Period).apply(lambda x: np.percentile(x, 75), raw=True)
+def calculate_m75(data, m75Period): return calculate_m75s(data, [m75Period])
+
+# Function to calculate the Moving 75%-iles of several periods in one pass
+@instrumented()
+def calculate_m75s(data, m75Periods):
+    m75s, labels = rolling_quantiles(data['Close'].to_numpy(), m75Periods, [0.75])
+    data[labels] = m75s.T
     return data
 
 # Function to check for warning signals
+@instrumented()
 def check_signals(nxd100_data, jeqp_data, vxn_data, vxn_thresh, sma_period):
     '''VXN Routine'''
-    # Calculate M75 for VXN
-    vxn_data = calculate_m75(vxn_data, 7)  # week m75 support
-    vxn_data = calculate_m75(vxn_data, 14) # 14d m75 support
-    vxn_data = calculate_m75(vxn_data, 30) # month m75 support
+    # Calculate week, 14d and month M75 support for VXN in one pass
+    vxn_data = calculate_m75s(vxn_data, [7, 14, 30])
 
     # Latest VXN value and short period SMA
     latest_vxn = vxn_data['Close'].iloc[-1].tolist() #[0]
@@ -64,15 +76,8 @@ def check_signals(nxd100_data, jeqp_data, vxn_data, vxn_thresh, sma_period):
     latest_vxn_m75_30 = vxn_data['M75_30'].iloc[-1].tolist()
     
     '''Nasdaq 100 Routine'''
-    # Calculate SMA200 for Nasdaq 100
-    nxd100_data = calculate_sma200(nxd100_data)
-
-    # Calculate 1 month, 3 month, 1 year and 150 SMA for Nasdaq 100
-    nxd100_data = calculate_sma(nxd100_data, sma_period)
-    nxd100_data = calculate_sma(nxd100_data, 31)  # month sma support
-    nxd100_data = calculate_sma(nxd100_data, 92)  # quarter sma support
-    nxd100_data = calculate_sma(nxd100_data, 150) # three quater 200sma support
-    nxd100_data = calculate_sma(nxd100_data, 365) # year sma support
+    # Calculate SMA200 and 1 month, 3 month, 1 year and 150 SMA for Nasdaq 100 in one pass
+    nxd100_data = calculate_smas(nxd100_data, [200, sma_period, 31, 92, 150, 365])
     
     # Latest Nasdaq 100 price and SMA200
     latest_nxd100_price = nxd100_data['Close'].iloc[-1].tolist() #[0]
@@ -89,15 +94,8 @@ def check_signals(nxd100_data, jeqp_data, vxn_data, vxn_thresh, sma_period):
             elif '50' in sma: latest_nxd100_sma50 = nxd100_data[sma].iloc[-1].tolist()
     
     '''JEQP Routine'''
-    # Calculate SMA200 for JEQP
-    jeqp_data = calculate_sma200(jeqp_data)
-
-    # Calculate 1 month, 3 month, 1 year and 150 SMA for JEQP
-    jeqp_data = calculate_sma(jeqp_data, sma_period)
-    jeqp_data = calculate_sma(jeqp_data, 31)  # month sma support
-    jeqp_data = calculate_sma(jeqp_data, 92)  # quarter sma support
-    jeqp_data = calculate_sma(jeqp_data, 150) # three quater 200sma support
-    jeqp_data = calculate_sma(jeqp_data, 365) # year sma support
+    # Calculate SMA200 and 1 month, 3 month, 1 year and 150 SMA for JEQP in one pass
+    jeqp_data = calculate_smas(jeqp_data, [200, sma_period, 31, 92, 150, 365])
     
     # Latest JEQP price and SMA500
     latest_jeqp_price = jeqp_data['Close'].iloc[-1].tolist() #[0]
@@ -182,6 +180,8 @@ def check_signals(nxd100_data, jeqp_data, vxn_data, vxn_thresh, sma_period):
     print("\n")
 
 def plot_scraped_data(ticker_data, vxn_data, vxn_thresh, sma_period, ticker_name): # ticker="^NDX"):
+    import matplotlib.pyplot as plt  # deferred, signal checks without plots never load matplotlib
+
     # Plotting
     fig, ax1 = plt.subplots(figsize=(14, 7))
 
@@ -235,16 +235,18 @@ def plot_scraped_data(ticker_data, vxn_data, vxn_thresh, sma_period, ticker_name
 # Main function
 def main(vxn_thresh, sma_period):
     # Get data
-    vxn_data = get_vxn_data()
-    nxd100_data = get_nasdaq100_data()
-    jeqp_data = get_jeqp_data()
+    with span("fetch", ticker='^VXN'): vxn_data = get_vxn_data()
+    with span("fetch", ticker='^NDX'): nxd100_data = get_nasdaq100_data()
+    with span("fetch", ticker='JEQP.DE'): jeqp_data = get_jeqp_data()
     
     # Check signals
     check_signals(nxd100_data, jeqp_data, vxn_data, vxn_thresh, sma_period)
 
     # Plot the scraped data
-    plot_scraped_data(nxd100_data, vxn_data, vxn_thresh, sma_period, ticker_name='Nasdaq 100')  #, ticker="^NDX")
-    plot_scraped_data(jeqp_data, vxn_data, vxn_thresh, sma_period, ticker_name='JEQP')  #, ticker="JEQP.DE")
+    with span("plot", ticker='Nasdaq 100'):
+        plot_scraped_data(nxd100_data, vxn_data, vxn_thresh, sma_period, ticker_name='Nasdaq 100')  #, ticker="^NDX")
+    with span("plot", ticker='JEQP'):
+        plot_scraped_data(jeqp_data, vxn_data, vxn_thresh, sma_period, ticker_name='JEQP')  #, ticker="JEQP.DE")
     
     
 # Run the script
@@ -1,8 +1,9 @@
-import yfinance as yf
+from market_data import price_cache
+from instrument import instrumented, span
+from indicators import multi_sma
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import matplotlib.pyplot as plt
 from sys import argv
 
 # On Linux or with different python version the commented out code might be needed!
@@ -20,12 +21,12 @@ TICKER_SMA_COLORS = ["red",
 
 # Function to get DAX data
 def get_dax_data():
-    dax = yf.download('^GDAXI', period='2y', interval='1d')
+    dax = price_cache.history('^GDAXI', '1d', period='2y').copy()  # copy as indicator columns get added
     return dax
 
 # Function to get LevDAX daily ETF data
 def get_lvdx_data():
-    lvdx = yf.download('LVDX.DE', period='2y', interval='1d')
+    lvdx = price_cache.history('LVDX.DE', '1d', period='2y').copy()  # copy as indicator columns get added
     return lvdx
 
 # Function to calculate Simple Moving Average
@@ -34,19 +35,20 @@ def calculate_sma(data, smaPeriod):
     return data
 def calculate_sma200(data): return calculate_sma(data, 200)
 
+# Function to calculate the Simple Moving Averages of several periods in one pass
+@instrumented()
+def calculate_smas(data, smaPeriods, dtype=np.float64):
+    smas, labels = multi_sma(data['Close'].to_numpy(), smaPeriods, dtype)
+    data[labels] = smas.T
+    return data
+
 
 # Function to check for warning signals
+@instrumented()
 def check_signals(dax_data, lvdx_data, sma_period):
     '''DAX Routine'''
-    # Calculate SMA200 for DAX
-    dax_data = calculate_sma200(dax_data)
-
-    # Calculate 1 month, 3 month, 1 year and 150 SMA for DAX
-    dax_data = calculate_sma(dax_data, sma_period)
-    dax_data = calculate_sma(dax_data, 31)  # month sma support
-    dax_data = calculate_sma(dax_data, 92)  # quarter sma support
-    dax_data = calculate_sma(dax_data, 150) # three quater 200sma support
-    dax_data = calculate_sma(dax_data, 365) # year sma support
+    # Calculate SMA200 and 1 month, 3 month, 1 year and 150 SMA for DAX in one pass
+    dax_data = calculate_smas(dax_data, [200, sma_period, 31, 92, 150, 365])
     
     # Latest DAX price and SMA200
     latest_dax_price = dax_data['Close'].iloc[-1].tolist() #[0]
@@ -63,15 +65,8 @@ def check_signals(dax_data, lvdx_data, sma_period):
             elif '50' in sma: latest_dax_sma50 = dax_data[sma].iloc[-1].tolist()
     
     '''LevDAX daily Routine'''
-    # Calculate SMA200 for LevDAX daily
-    lvdx_data = calculate_sma200(lvdx_data)
-
-    # Calculate 1 month, 3 month, 1 year and 150 SMA for LevDAX daily
-    lvdx_data = calculate_sma(lvdx_data, sma_period)
-    lvdx_data = calculate_sma(lvdx_data, 31)  # month sma support
-    lvdx_data = calculate_sma(lvdx_data, 92)  # quarter sma support
-    lvdx_data = calculate_sma(lvdx_data, 150) # three quater 200sma support
-    lvdx_data = calculate_sma(lvdx_data, 365) # year sma support
+    # Calculate SMA200 and 1 month, 3 month, 1 year and 150 SMA for LevDAX daily in one pass
+    lvdx_data = calculate_smas(lvdx_data, [200, sma_period, 31, 92, 150, 365])
     
     # Latest LevDAX daily price and SMA500
     latest_lvdx_price = lvdx_data['Close'].iloc[-1].tolist() #[0]
@@ -144,6 +139,8 @@ def check_signals(dax_data, lvdx_data, sma_period):
     print("\n")
 
 def plot_scraped_data(ticker_data, sma_period, ticker_name): # ticker="^GDAXI"):
+    import matplotlib.pyplot as plt  # deferred, signal checks without plots never load matplotlib
+
     # Plotting
     fig1, ax1 = plt.subplots(figsize=(14, 7))
 
@@ -175,15 +172,17 @@ def plot_scraped_data(ticker_data, sma_period, ticker_name): # ticker="^GDAXI"):
 # Main function
 def main(sma_period):
     # Get data
-    dax_data = get_dax_data()
-    lvdx_data = get_lvdx_data()
+    with span("fetch", ticker='^GDAXI'): dax_data = get_dax_data()
+    with span("fetch", ticker='LVDX.DE'): lvdx_data = get_lvdx_data()
     
     # Check signals
     check_signals(dax_data, lvdx_data, sma_period)
 
     # Plot the scraped data
-    plot_scraped_data(dax_data, sma_period, ticker_name='DAX')  #, ticker="^GDAXI")
-    plot_scraped_data(lvdx_data, sma_period, ticker_name='LevDAX')  #, ticker="LVDX.DE")
+    with span("plot", ticker='DAX'):
+        plot_scraped_data(dax_data, sma_period, ticker_name='DAX')  #, ticker="^GDAXI")
+    with span("plot", ticker='LevDAX'):
+        plot_scraped_data(lvdx_data, sma_period, ticker_name='LevDAX')  #, ticker="LVDX.DE")
     
 # Run the script
 if __name__ == "__main__":
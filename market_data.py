@@ -0,0 +1,367 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Hashable, Optional, Sequence, Tuple
+from price_files import CACHE_DIR, MAX_AGE, period_start, price_dir, read_bars, read_meta
+
+# Intervals whose bars span several days, a start date inside such a bar still selects the whole bar
+MULTI_DAY_INTERVALS = ("5d", "1wk", "1mo", "3mo")
+
+# Fetch Settings
+MAX_WORKERS = 8  # concurrent requests
+RETRIES = 3      # retries per request after the first attempt failed
+BACKOFF = 0.5    # seconds before the first retry, doubled for every further retry
+TIMEOUT = 30     # seconds per request attempt
+POLL = 0.05      # seconds between checks while a submitted attempt has not started yet
+RETRY_ON = (OSError,)  # transient errors worth retrying (network errors and timeouts are OSErrors)
+
+
+''' Data Providers '''
+class DataProvider:
+    # Function to get the bars of a symbol in [start, end) as DataFrame with a DatetimeIndex
+    def history(self, symbol: str, start: Optional[str] = None, end: Optional[str] = None,
+                interval: str = "1d") -> pd.DataFrame:
+        raise NotImplementedError
+
+    # Function to get the bars of several symbols in [start, end) with as few requests as possible, {symbol: DataFrame}
+    # -> by default every symbol is requested on its own
+    def history_many(self, symbols: Sequence[str], start: Optional[str] = None, end: Optional[str] = None,
+                     interval: str = "1d") -> Dict[str, pd.DataFrame]:
+        return {symbol: self.history(symbol, start, end, interval) for symbol in symbols}
+
+    # Function to get the earnings table of a symbol (columns 'Earnings Date' and 'Reported EPS')
+    def earnings_history(self, symbol: str) -> pd.DataFrame:
+        raise NotImplementedError
+
+    # Function to get the fundamentals dict of a symbol (e.g. 'epsTrailingTwelveMonths')
+    def info(self, symbol: str) -> dict:
+        raise NotImplementedError
+
+
+class YFinanceProvider(DataProvider):
+    # helper function to get an attribute of a yfinance Ticker, rate limits are reported as (retryable) ConnectionError
+    def _get(self, symbol, attr, *args, **kwargs):
+        from yfinance import Ticker
+        from yfinance.exceptions import YFRateLimitError
+        try:
+            value = getattr(Ticker(symbol), attr)
+            return value(*args, **kwargs) if callable(value) else value
+        except YFRateLimitError as err:
+            raise ConnectionError(str(err)) from err
+
+    def history(self, symbol, start=None, end=None, interval="1d"):
+        return self._get(symbol, "history", start=start, end=end, interval=interval)
+
+    # one yfinance download for all symbols, bars are indexed by the exchanges' local dates (without time zone)
+    def history_many(self, symbols, start=None, end=None, interval="1d"):
+        import yfinance
+        from yfinance.exceptions import YFRateLimitError
+        try:
+            data = yfinance.download(list(symbols), start=start, end=end, interval=interval, group_by="ticker",
+                                     actions=True, auto_adjust=True, ignore_tz=True, progress=False)
+        except YFRateLimitError as err:
+            raise ConnectionError(str(err)) from err
+        frames = dict()
+        for symbol in symbols:
+            frame = data[symbol] if data is not None and symbol in data.columns.get_level_values(0) else pd.DataFrame()
+            frames[symbol] = frame.dropna(subset=[col for col in ("Open", "High", "Low", "Close") if col in frame], how="all")
+        return frames
+
+    def earnings_history(self, symbol):
+        return self._get(symbol, "earnings_history")
+
+    def info(self, symbol):
+        return self._get(symbol, "info")
+
+
+# Offline stand-in serving fixed data (e.g. for tests or replaying stored data), unknown symbols raise a KeyError
+class LocalProvider(DataProvider):
+    def __init__(self, frames: Dict[str, pd.DataFrame], earnings: Optional[Dict[str, pd.DataFrame]] = None,
+                 infos: Optional[Dict[str, dict]] = None):
+        self.frames = frames
+        self.earnings = earnings or dict()
+        self.infos = infos or dict()
+        self.calls = list()
+
+    def history(self, symbol, start=None, end=None, interval="1d"):
+        self.calls.append((symbol, start, end, interval))
+        df = self.frames[symbol]
+        return slice_dates(df, start, end, interval in MULTI_DAY_INTERVALS).copy()
+
+    def history_many(self, symbols, start=None, end=None, interval="1d"):
+        self.calls.append((tuple(symbols), start, end, interval))
+        return {symbol: slice_dates(self.frames[symbol], start, end, interval in MULTI_DAY_INTERVALS).copy() for symbol in symbols}
+
+    def earnings_history(self, symbol):
+        self.calls.append((symbol, "earnings_history"))
+        return self.earnings[symbol].copy()
+
+    def info(self, symbol):
+        self.calls.append((symbol, "info"))
+        return dict(self.infos[symbol])
+
+
+# helper function to cut a date sorted DataFrame to [start, end) with plain date strings (as view, no copy)
+def slice_dates(df: pd.DataFrame, start: Optional[str] = None, end: Optional[str] = None, whole_bars: bool = False) -> pd.DataFrame:
+    index = df.index.tz_localize(None) if df.index.tz is not None else df.index
+    if start is None: lo = 0
+    elif whole_bars: lo = max(index.searchsorted(pd.Timestamp(start), side="right")-1, 0)
+    else: lo = index.searchsorted(pd.Timestamp(start))
+    hi = index.searchsorted(pd.Timestamp(end)) if end is not None else len(df)
+    return df.iloc[lo:hi]
+
+
+''' Price History Cache '''
+# Columnar on-disk cache of price histories keyed by symbol and interval
+# -> every symbol is one (columns x bars) float64 .npy file plus an int64 index file, read back memory-mapped
+#    so loading is zero-copy, and only bars after the last stored date are fetched from the provider
+class PriceCache:
+    def __init__(self, root: str = CACHE_DIR, provider: Optional[DataProvider] = None, max_age: timedelta = MAX_AGE):
+        self.root = root
+        self.provider = provider or YFinanceProvider()
+        self.max_age = max_age
+
+    def _dir(self, symbol: str, interval: str) -> str:
+        return price_dir(self.root, symbol, interval)
+
+    def _read_meta(self, path: str) -> Optional[dict]:
+        return read_meta(path)
+
+    # meta.json is replaced atomically and marks which version of the data files is current
+    def _write_meta(self, path: str, meta: dict):
+        with open(os.path.join(path, "meta.tmp"), "w") as f: json.dump(meta, f)
+        os.replace(os.path.join(path, "meta.tmp"), os.path.join(path, "meta.json"))
+
+    # Function to load the stored bars of a symbol (None if nothing is stored yet)
+    def load(self, symbol: str, interval: str = "1d") -> Optional[pd.DataFrame]:
+        path = self._dir(symbol, interval)
+        meta = self._read_meta(path)
+        if meta is None: return None
+        index, values = read_bars(path, meta)
+        index = pd.DatetimeIndex(index.view("datetime64[ns]"), name="Date").tz_localize("UTC")
+        if meta["tz"]: index = index.tz_convert(meta["tz"])
+        else: index = index.tz_localize(None)
+        # (columns x bars) block transposed is exactly pandas' internal layout, so no copy is made
+        return pd.DataFrame(values.T, index=index, columns=meta["columns"], copy=False)
+
+    # Function to write bars of a symbol to the cache
+    def store(self, symbol: str, interval: str, df: pd.DataFrame, start: Optional[str] = None):
+        path = self._dir(symbol, interval)
+        os.makedirs(path, exist_ok=True)
+        old = self._read_meta(path)
+        version = old["version"]+1 if old else 0
+
+        index = df.index.tz_convert("UTC") if df.index.tz is not None else df.index.tz_localize("UTC")
+        np.save(os.path.join(path, f"index_{version}.npy"), index.asi8)
+        np.save(os.path.join(path, f"values_{version}.npy"), np.ascontiguousarray(df.to_numpy(dtype=float).T))
+        starts = [s for s in (start, old and old["start"]) if s]
+        meta = {"version": version, "columns": [str(col) for col in df.columns],
+                "tz": str(df.index.tz) if df.index.tz is not None else None,
+                "start": min(starts) if starts else None, "fetched": datetime.now().isoformat()}
+        self._write_meta(path, meta)
+
+        # remove the previous version (may still be mapped on some platforms, then it is left for next time)
+        for name in os.listdir(path):
+            if name.endswith(".npy") and not name.endswith(f"_{version}.npy"):
+                try: os.remove(os.path.join(path, name))
+                except OSError: pass
+
+    # helper function to load the stored bars of a symbol and tell what is missing: 'full' (nothing usable stored),
+    # 'refresh' (older than max_age) or None (up to date)
+    def _status(self, symbol: str, interval: str, start: Optional[str]):
+        meta = self._read_meta(self._dir(symbol, interval))
+        cached = self.load(symbol, interval) if meta else None
+        if cached is None or len(cached)==0 or (start is not None and (meta["start"] is None or start<meta["start"])):
+            return cached, meta, "full"
+        if datetime.now()-datetime.fromisoformat(meta["fetched"]) > self.max_age: return cached, meta, "refresh"
+        return cached, meta, None
+
+    # helper function to replace the stored bars from the first new bar on (the last stored bar may have been incomplete)
+    def _append(self, symbol: str, interval: str, cached: pd.DataFrame, meta: dict, new: pd.DataFrame) -> pd.DataFrame:
+        if not len(new):
+            meta["fetched"] = datetime.now().isoformat()
+            self._write_meta(self._dir(symbol, interval), meta)
+            return cached
+        new = new.reindex(columns=cached.columns)
+        if cached.index.tz is not None:
+            new.index = new.index.tz_convert(cached.index.tz) if new.index.tz is not None else new.index.tz_localize(cached.index.tz)
+        elif new.index.tz is not None: new.index = new.index.tz_localize(None)
+        kept = cached[cached.index < new.index[0]]
+        self.store(symbol, interval, pd.concat([kept, new]))
+        return self.load(symbol, interval)
+
+    # Function to get the bars of a symbol in [start, end) and only download what is missing locally
+    def history(self, symbol: str, interval: str = "1d", start: Optional[str] = None, end: Optional[str] = None,
+                period: Optional[str] = None) -> pd.DataFrame:
+        if period is not None: start = period_start(period)
+        cached, meta, missing = self._status(symbol, interval, start)
+        if missing == "full":
+            # nothing usable stored -> full download up to today
+            self.store(symbol, interval, self.provider.history(symbol, start=start, end=None, interval=interval), start)
+            cached = self.load(symbol, interval)
+        elif missing == "refresh":
+            new = self.provider.history(symbol, start=str(cached.index[-1].date()), end=None, interval=interval)
+            cached = self._append(symbol, interval, cached, meta, new)
+        return slice_dates(cached, start, end, interval in MULTI_DAY_INTERVALS)
+
+    # Function to get the bars of several symbols in [start, end), {symbol: DataFrame}
+    # -> everything missing locally is fetched in one batched provider request from the earliest date any symbol needs
+    def history_many(self, symbols: Sequence[str], interval: str = "1d", start: Optional[str] = None,
+                     end: Optional[str] = None, period: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+        if period is not None: start = period_start(period)
+        status = {symbol: self._status(symbol, interval, start) for symbol in dict.fromkeys(symbols)}
+        missing = [symbol for symbol, (_, _, need) in status.items() if need]
+        if missing:
+            firsts = [start if need == "full" else str(cached.index[-1].date()) for cached, _, need in (status[symbol] for symbol in missing)]
+            first = None if None in firsts else min(firsts)
+            fetched = self.provider.history_many(missing, start=first, end=None, interval=interval)
+            for symbol in missing:
+                cached, meta, need = status[symbol]
+                new = fetched.get(symbol, pd.DataFrame())
+                if need == "full" and not len(new): cached = new  # unknown symbol, nothing to store
+                elif need == "full":
+                    self.store(symbol, interval, new, first)
+                    cached = self.load(symbol, interval)
+                else: cached = self._append(symbol, interval, cached, meta, new)
+                status[symbol] = (cached, meta, None)
+        return {symbol: slice_dates(cached, start, end, interval in MULTI_DAY_INTERVALS) if len(cached) else cached
+                for symbol, (cached, _, _) in status.items()}
+
+
+''' Fundamentals Cache '''
+# Function to parse a whole column of 'Earnings Date' strings like 'Oct 24, 2024, 4 PM EDT' at once
+# -> the time of day is dropped and all dates are parsed with one fixed format (dateutil only as fallback),
+#    columns which already hold datetimes are passed through without their timezone
+def parse_earnings_dates(values) -> pd.DatetimeIndex:
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        dates = pd.DatetimeIndex(values)
+        return (dates.tz_localize(None) if dates.tz is not None else dates).normalize()
+    days = values.astype(str).str.extract(r"^([^,]*,[^,]*)", expand=False)
+    try: return pd.DatetimeIndex(pd.to_datetime(days, format="%b %d, %Y"))
+    except ValueError: return pd.DatetimeIndex(pd.to_datetime(days))
+
+
+# Function to get the next scheduled earnings date of an earnings table (date rows without reported EPS yet)
+def next_earnings_date(earnings: pd.DataFrame, today: Optional[date] = None) -> Optional[pd.Timestamp]:
+    today = pd.Timestamp(today or date.today())
+    if "Earnings Date" not in earnings or "Reported EPS" not in earnings: return None
+    dates = parse_earnings_dates(earnings["Earnings Date"])
+    upcoming = dates[(dates >= today) & earnings["Reported EPS"].isna().to_numpy()]
+    return upcoming.min() if len(upcoming) else None
+
+
+# Time to live of the cached fundamentals per field (they only change with the quarterly reports)
+FUNDAMENTALS_TTL = {"earnings_history": timedelta(days=92), "info": timedelta(days=7)}
+
+
+# On-disk cache of the slow fundamentals requests (earnings history and info dict) with a time to live per field
+# -> entries are JSON files, so they survive restarts, an earnings history expires already on the day after its
+#    next scheduled earnings date (new EPS can only appear then), until then no request is sent for the symbol
+class FundamentalsCache:
+    def __init__(self, root: str = CACHE_DIR, provider: Optional[DataProvider] = None,
+                 ttl: Optional[Dict[str, timedelta]] = None):
+        self.root = root
+        self.provider = provider or YFinanceProvider()
+        self.ttl = {**FUNDAMENTALS_TTL, **(ttl or dict())}
+
+    def _path(self, symbol: str, field: str) -> str:
+        return os.path.join(self.root, "fundamentals", field, symbol.replace("/", "_")+".json")
+
+    def _read(self, symbol: str, field: str) -> Optional[dict]:
+        try:
+            with open(self._path(symbol, field)) as f: return json.load(f)
+        except (OSError, ValueError): return None
+
+    # entries are replaced atomically, a crash never leaves a half written file behind
+    def _write(self, symbol: str, field: str, entry: dict):
+        path = self._path(symbol, field)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path+".tmp", "w") as f: json.dump(entry, f, default=str)
+        os.replace(path+".tmp", path)
+
+    # helper function to get a stored field while it is still valid, else fetch and store it
+    def _get(self, symbol: str, field: str, encode: Callable, decode: Callable, expires: Callable):
+        entry = self._read(symbol, field)
+        if entry is not None and datetime.now() < datetime.fromisoformat(entry["expires"]): return decode(entry["value"])
+        value = getattr(self.provider, field)(symbol)
+        now = datetime.now()
+        self._write(symbol, field, {"fetched": now.isoformat(), "expires": min(now+self.ttl[field], expires(value, now)).isoformat(),
+                                    "value": encode(value)})
+        return value
+
+    # Function to get the earnings table of a symbol, served from disk until new earnings are due
+    def earnings_history(self, symbol: str) -> pd.DataFrame:
+        def expires(earnings, now):
+            upcoming = next_earnings_date(earnings, now.date())
+            return (upcoming+timedelta(days=1)).to_pydatetime() if upcoming is not None else now+self.ttl["earnings_history"]
+        return self._get(symbol, "earnings_history", lambda df: df.to_dict(orient="split"),
+                         lambda value: pd.DataFrame(**value), expires)
+
+    # Function to get the fundamentals dict of a symbol, served from disk within its time to live
+    def info(self, symbol: str) -> dict:
+        return self._get(symbol, "info", dict, dict, lambda value, now: now+self.ttl["info"])
+
+    # Function to drop the stored fields of a symbol (all fields if none is given)
+    def invalidate(self, symbol: str, field: Optional[str] = None):
+        for name in ([field] if field else self.ttl):
+            try: os.remove(self._path(symbol, name))
+            except OSError: pass
+
+
+''' Concurrent Fetching '''
+# Function to run independent requests {key: (fn, args)} on a bounded thread pool
+# -> attempts failing with a transient error or timing out are retried with exponential backoff,
+#    returns ({key: result}, {key: last error}) (a timed out attempt cannot be killed, its thread finishes in the background)
+def fetch_concurrently(requests: Dict[Hashable, Tuple[Callable, tuple]], max_workers: int = MAX_WORKERS,
+                       retries: int = RETRIES, backoff: float = BACKOFF, timeout: float = TIMEOUT,
+                       retry_on: tuple = RETRY_ON):
+    results, errors, started = dict(), dict(), dict()
+    def attempt(key):
+        started[key] = time.monotonic()
+        fn, args = requests[key]
+        return fn(*args)
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    running = {pool.submit(attempt, key): (key, 0) for key in requests}
+    retry_at = list()
+    try:
+        while running or retry_at:
+            now = time.monotonic()
+            for item in [item for item in retry_at if item[0]<=now]:
+                retry_at.remove(item)
+                started.pop(item[1], None)
+                running[pool.submit(attempt, item[1])] = (item[1], item[2])
+
+            # sleep until a request finishes, times out or a retry is due
+            # -> attempts whose thread has not started yet have no deadline, until they do the loop checks back
+            #    every POLL seconds (a deadline taken at submit would count the time queued behind other requests)
+            wakeups = [item[0] for item in retry_at] + [started[key]+timeout for key,_ in running.values() if key in started]
+            if any(key not in started for key,_ in running.values()): wakeups.append(now+min(POLL, timeout))
+            wait_time = max(min(wakeups)-now, 0) if wakeups else None
+            if running: done = wait(running, timeout=wait_time, return_when=FIRST_COMPLETED).done
+            else:
+                time.sleep(wait_time)
+                done = set()
+
+            now = time.monotonic()
+            for future,(key,num) in list(running.items()):
+                if future in done: error = future.exception()
+                elif key in started and now-started[key] > timeout: error = TimeoutError(f"{key} took longer than {timeout}s")
+                else: continue
+                del running[future]
+                if error is None: results[key] = future.result()
+                elif num < retries and isinstance(error, retry_on): retry_at.append((now+backoff*2**num, key, num+1))
+                else: errors[key] = error
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results, errors
+
+
+# Default cache used by the notebooks and strategy helpers
+price_cache = PriceCache()
+fundamentals_cache = FundamentalsCache(provider=price_cache.provider)
@@ -0,0 +1,69 @@
+import numpy as np
+from typing import Optional
+
+# Months per year of the monthly (months x tickers) arrays
+MONTHS = 12
+
+
+# helper function for a cumulative product along the months which skips NaNs like pandas' cumprod
+def _nancumprod(values: np.ndarray) -> np.ndarray:
+    missing = np.isnan(values)
+    product = np.where(missing, 1.0, values).cumprod(axis=0)
+    product[missing] = np.nan
+    return product
+
+
+# Function to get the monthly returns of aligned monthly prices (months x tickers), the first month is NaN
+# -> a rise from a zero price counts as no return
+def monthly_returns(prices: np.ndarray) -> np.ndarray:
+    prices = np.asarray(prices, dtype=float)
+    returns = np.full(prices.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = prices[1:]/prices[:-1]-1
+    returns[np.isposinf(returns)] = 0.0
+    return returns
+
+
+# Function to get the cumulative growth factor of every ticker since the first month
+def cumulative_growth(prices: np.ndarray) -> np.ndarray:
+    return _nancumprod(1+monthly_returns(prices))
+
+
+# Function to get the total return factor (growth with reinvested dividends) of every ticker since the first month
+def total_return(prices: np.ndarray, dividends: np.ndarray) -> np.ndarray:
+    prices, dividends = np.asarray(prices, dtype=float), np.asarray(dividends, dtype=float)
+    payout = np.full(prices.shape, np.nan)
+    payout[1:] = dividends[1:]/np.where(prices[:-1]==0, 1.0, prices[:-1])
+    return cumulative_growth(prices)*_nancumprod(1+payout)
+
+
+# Function to get the yearly price change in % from every 12th month to the next (years x tickers)
+def annual_yields(prices: np.ndarray) -> np.ndarray:
+    prices = np.asarray(prices, dtype=float)
+    return (prices[MONTHS::MONTHS]/prices[:-MONTHS:MONTHS]-1)*100
+
+
+# Function to get the standard deviation of the prices within every full year relative to the first price
+# after it in % (years x tickers), all years in one reshape instead of a slice per year
+def annual_volatility(prices: np.ndarray) -> np.ndarray:
+    prices = np.asarray(prices, dtype=float)
+    years = (len(prices)-1)//MONTHS
+    blocks = prices[:years*MONTHS].reshape((years, MONTHS)+prices.shape[1:])
+    return blocks.std(axis=1, ddof=1)/prices[MONTHS:years*MONTHS+1:MONTHS]*100
+
+
+# Function to get the P/E ratio from prices and annual earnings per share of the same dates,
+# earnings are clipped at a tiny positive value so losses show as huge ratios instead of negative ones
+def pe_ratio(prices: np.ndarray, earnings: np.ndarray) -> np.ndarray:
+    return np.asarray(prices, dtype=float)/np.clip(np.asarray(earnings, dtype=float), 1e-8, None)
+
+
+# Function to compute all metrics of aligned monthly prices and dividends (months x tickers) in one go
+# -> earnings are the annual EPS at every 12th month (years x tickers), without them no P/E is computed,
+#    returns plain arrays keyed by metric, no pandas or plotting involved, e.g. to screen thousands of tickers
+def compute_metrics(prices: np.ndarray, dividends: np.ndarray, earnings: Optional[np.ndarray] = None) -> dict:
+    prices = np.asarray(prices, dtype=float)
+    metrics = {"cumulative_growth": cumulative_growth(prices), "total_return": total_return(prices, dividends),
+               "annual_yields": annual_yields(prices), "annual_volatility": annual_volatility(prices)}
+    if earnings is not None: metrics["pe_ratio"] = pe_ratio(prices[::MONTHS][:len(earnings)], earnings)
+    return metrics
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+from market_data import CACHE_DIR
+from regression import nested_window_grams, stacked_forecast, window_models
+
+# Bump when the regressor changes, stored models of older versions are then refitted
+MODEL_VERSION = 1
+
+# Layout of a stored entry (one flat float64 array, dates are int64 bits): header, then values, dates,
+# forecast and the Gram matrix of every timing (ascending)
+HEADER = 4  # bars, forecast steps, shift, rows changed since the last full fit
+
+
+# Function to get the parameters a stored model depends on (part of every entry key)
+def regressor_params(timings: Sequence[int], repeat: int, steps: Sequence[int]) -> bytes:
+    return f"v{MODEL_VERSION};timings={list(timings)};repeat={repeat};steps={list(steps)}".encode()
+
+
+# Function to get the fingerprint of a series (its dates and values) under the regressor's parameters
+def fingerprint(values: np.ndarray, dates: np.ndarray, params: bytes) -> str:
+    digest = hashlib.sha1(params)
+    digest.update(np.ascontiguousarray(dates, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+# helper function to get the dates of a series index as int64 (nanoseconds of datetimes, plain integers else)
+def index_dates(index) -> np.ndarray:
+    asi8 = getattr(index, "asi8", None)
+    return np.asarray(asi8 if asi8 is not None else index, dtype=np.int64)
+
+
+# helper function to get the Gram matrices of the given target rows of a timing in (stacked) series (rows [window..., target, 1])
+def _rows_gram(shifted: np.ndarray, timing: int, targets: range):
+    if len(targets) == 0: return 0.0
+    positions = np.arange(targets.start, targets.stop)
+    rows = np.ones(shifted.shape[:-1]+(len(positions), timing+2))
+    rows[..., :timing+1] = shifted[..., positions[:, None] + np.arange(-timing, 1)]
+    return np.swapaxes(rows, -1, -2) @ rows
+
+
+# One fitted series: the series it was fitted on, the shift of its cross-products, the Gram matrices of the
+# lag window regressions per timing, the forecast and the rows changed since its last full fit
+class _Entry:
+    __slots__ = ("values", "dates", "shift", "grams", "forecast", "changed")
+
+    def __init__(self, values, dates, shift, grams, forecast, changed):
+        self.values, self.dates, self.shift, self.grams, self.forecast, self.changed = values, dates, shift, grams, forecast, changed
+
+    def to_array(self) -> np.ndarray:
+        header = [len(self.values), len(self.forecast), self.shift, self.changed]
+        return np.concatenate([header, self.values, self.dates.view(np.float64), self.forecast]
+                              + [self.grams[timing].ravel() for timing in sorted(self.grams)])
+
+    @classmethod
+    def from_array(cls, data: np.ndarray, timings: Sequence[int]) -> "_Entry":
+        n, steps = int(data[0]), int(data[1])
+        values = data[HEADER:HEADER+n]
+        dates = data[HEADER+n:HEADER+2*n].view(np.int64)
+        pos = HEADER+2*n+steps
+        grams = dict()
+        for timing in sorted(set(timings)):
+            size = (timing+2)**2
+            grams[timing] = data[pos:pos+size].reshape(timing+2, timing+2)
+            pos += size
+        return cls(values, dates, float(data[2]), grams, data[HEADER+2*n:HEADER+2*n+steps], int(data[3]))
+
+
+# Store of fitted three layer regressors, one entry per series key (e.g. 'SPY/Close') and regressor parameters
+# -> the same series again (same fingerprint) returns the stored forecast, a series that gained bars at the end, lost
+#    bars at the start or had its latest bars revised (e.g. the running month) only updates the Gram matrices by
+#    the rank-one terms of the removed and added rows and solves them again, anything else (e.g. a dividend
+#    adjusted history) is refitted, updated and refitted series are solved together in batches per length
+# -> downdating piles up rounding errors, so an entry is refitted once as many rows changed as it has bars
+# -> entries are .npy files below root/models, loaded entries are kept in memory for the following calls,
+#    without root entries are only kept in memory (e.g. for walk-forward evaluations)
+class ModelStore:
+    def __init__(self, root: Optional[str] = CACHE_DIR):
+        self.root = root
+        self.entries: Dict[str, _Entry] = dict()
+
+    def _path(self, key: str, params: bytes) -> str:
+        return os.path.join(self.root or "", "models", hashlib.sha1(key.encode()+b"\0"+params).hexdigest()+".npy")
+
+    # Function to get the stored entry of a series key (None if there is none)
+    def load(self, key: str, params: bytes, timings: Sequence[int]) -> Optional[_Entry]:
+        path = self._path(key, params)
+        if path not in self.entries:
+            if self.root is None: return None
+            try: self.entries[path] = _Entry.from_array(np.load(path), timings)
+            except (OSError, ValueError): return None
+        return self.entries[path]
+
+    # entries are replaced atomically, a crash never leaves a half written file behind
+    def store(self, key: str, params: bytes, entry: _Entry):
+        path = self._path(key, params)
+        self.entries[path] = entry
+        if self.root is None: return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path+".tmp", "wb") as f: np.save(f, entry.to_array())
+        os.replace(path+".tmp", path)
+
+    # Function to drop the stored entry of a series key
+    def invalidate(self, key: str, params: bytes):
+        path = self._path(key, params)
+        self.entries.pop(path, None)
+        if self.root is None: return
+        try: os.remove(path)
+        except OSError: pass
+
+    # helper function to line a changed series up with its stored entry, returns (bars dropped at the start,
+    # unchanged bars of the new series, rows changed since the last full fit)
+    # -> None if the series does not continue the stored one or changed too much for an update
+    def _alignment(self, entry: _Entry, values: np.ndarray, dates: np.ndarray, timings: List[int]):
+        old, old_dates = entry.values, entry.dates
+        m, n = len(old), len(values)
+        # the new series has to start on a stored bar and share the dates from there on
+        drop = int(np.searchsorted(old_dates, dates[0]))
+        if drop >= m or old_dates[drop] != dates[0]: return None
+        overlap = min(m-drop, n)
+        if not np.array_equal(old_dates[drop:drop+overlap], dates[:overlap]): return None
+        same = old[drop:drop+overlap] == values[:overlap]
+        keep = overlap if same.all() else int(np.argmin(same))
+        changed = entry.changed + drop + (m-drop-keep) + (n-keep)
+        if keep <= max(timings) or changed >= n: return None
+        return drop, keep, changed
+
+    # Function to forecast the given steps of several series with the three layer regressor (see regression.py)
+    # -> keys name the series (one stored entry each), values and dates are one array per series
+    # -> returns the forecasts (one array per series) and how each was obtained ('stored', 'updated' or 'fitted')
+    def batch_forecast(self, keys: Sequence[str], values: Sequence[np.ndarray], dates: Sequence[np.ndarray],
+                       timings: List[int], repeat: int, steps: Sequence[int]):
+        params = regressor_params(timings, repeat, steps)
+        values = [np.asarray(vals, dtype=float) for vals in values]
+        dates = [np.asarray(dts, dtype=np.int64) for dts in dates]
+        forecasts, sources = [None]*len(keys), [None]*len(keys)
+        entries, groups = dict(), dict()
+        for num, key in enumerate(keys):
+            entry = self.load(key, params, timings)
+            if entry is not None and fingerprint(entry.values, entry.dates, params) == fingerprint(values[num], dates[num], params):
+                forecasts[num], sources[num] = entry.forecast, "stored"
+                continue
+            # series lined up the same way with their entries are updated together, the others are fitted per length
+            alignment = self._alignment(entry, values[num], dates[num], timings) if entry is not None else None
+            if alignment is not None: entries[num] = entry
+            group = (len(values[num]), len(entry.values), *alignment[:2]) if alignment else (len(values[num]), )
+            groups.setdefault(group, list()).append(num)
+
+        for group, nums in groups.items():
+            stacked = np.array([values[num] for num in nums])
+            if len(group) > 1:
+                # remove the rows of dropped and changed bars, add the rows of changed and new bars
+                n, m, drop, keep = group
+                shift = np.array([[entries[num].shift] for num in nums])
+                old, new = np.array([entries[num].values for num in nums])-shift, stacked-shift
+                grams = {timing: np.array([entries[num].grams[timing] for num in nums])
+                                 - _rows_gram(old, timing, range(timing, drop+timing)) - _rows_gram(old, timing, range(drop+keep, m))
+                                 + _rows_gram(new, timing, range(keep, n)) for timing in set(timings)}
+                changed = [entries[num].changed + drop + (m-drop-keep) + (n-keep) for num in nums]
+            else:
+                shift = stacked.mean(axis=-1, keepdims=True)
+                grams = nested_window_grams(stacked-shift, timings)
+                changed = [0]*len(nums)
+            preds = stacked_forecast(stacked, window_models(stacked-shift, shift, grams), timings, repeat, steps)
+            for row, num in enumerate(nums):
+                entry = _Entry(values[num], dates[num], float(shift[row, 0]), {timing: gram[row] for timing, gram in grams.items()},
+                               preds[row], changed[row])
+                self.store(keys[num], params, entry)
+                forecasts[num], sources[num] = preds[row], "updated" if len(group) > 1 else "fitted"
+        return forecasts, sources
+
+
+# Store in the local cache directory
+model_store = ModelStore()
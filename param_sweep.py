@@ -0,0 +1,127 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from sys import argv
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence
+from backtest import (STEP_EXPOSURE, STRATEGIES, equity_curves, first_valid, ladder_steps, max_drawdown,
+                      prepare_signals)
+from signal_stream import VOL_FACTORS, signal_sma_windows
+
+# Sweep Settings
+CHUNK_SIZE = 250  # parameter sets per task sent to a worker
+SHARED_ARRAYS = ("etf_close", "etf_smas", "index_close", "index_smas", "vol", "m75s")
+
+# arrays of the precomputed signals inside a worker process (views into the shared memory block)
+_SIGNALS = dict()
+_SHM = None
+
+
+# Function to build the full grid of parameter sets
+# -> vol_factors is one list of candidates per M75 window (7, 14, 30)
+def grid_params(vol_threshs: Sequence[Optional[float]], sma_periods: Sequence[int],
+                vol_factors: Sequence[Sequence[float]] = tuple((factor,) for factor in VOL_FACTORS)) -> List[dict]:
+    return [{"vol_thresh": thresh, "sma_period": period, "vol_factors": list(factors)}
+            for thresh, period, factors in itertools.product(vol_threshs, sma_periods, itertools.product(*vol_factors))]
+
+
+# Function to draw random parameter sets, thresholds and periods are integers like the argv options of the helpers
+def random_params(n: int, vol_thresh=(15, 45), sma_period=(10, 150), vol_factors=((0.6, 1.0),)*3,
+                  seed: Optional[int] = None) -> List[dict]:
+    rng = np.random.default_rng(seed)
+    threshs = rng.integers(vol_thresh[0], vol_thresh[1]+1, n) if vol_thresh is not None else [None]*n
+    periods = rng.integers(sma_period[0], sma_period[1]+1, n)
+    factors = np.round(np.stack([rng.uniform(lo, hi, n) for lo, hi in vol_factors], axis=-1), 2)
+    return [{"vol_thresh": None if thresh is None else int(thresh), "sma_period": int(period), "vol_factors": list(facs)}
+            for thresh, period, facs in zip(threshs, periods, factors.tolist())]
+
+
+# helper function to copy the signal arrays into one shared memory block, returns (block, {name: (offset, shape)})
+def _share(signals: dict):
+    arrays = {name: np.ascontiguousarray(signals[name], dtype=np.float64) for name in SHARED_ARRAYS if name in signals}
+    layout, offset = dict(), 0
+    for name, array in arrays.items():
+        layout[name] = (offset, array.shape)
+        offset += array.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for name, array in arrays.items():
+        np.ndarray(array.shape, dtype=np.float64, buffer=shm.buf, offset=layout[name][0])[...] = array
+    return shm, layout
+
+
+# helper function to attach a worker to the shared signal arrays
+def _init_worker(shm_name: str, layout: dict, labels: List[str]):
+    global _SHM
+    _SHM = shared_memory.SharedMemory(name=shm_name)
+    _SIGNALS.clear()
+    for name, (offset, shape) in layout.items():
+        _SIGNALS[name] = np.ndarray(shape, dtype=np.float64, buffer=_SHM.buf, offset=offset)
+    _SIGNALS["labels"] = labels
+
+
+# helper function to backtest a chunk of parameter sets on the shared signals, returns [(total return, max drawdown)]
+def _run_chunk(params: List[dict], start: int, exposures: Dict[str, float], lag: int, cost: float):
+    results = list()
+    close = _SIGNALS["etf_close"][start:]
+    for param in params:
+        steps, _ = ladder_steps(_SIGNALS, param["sma_period"], param["vol_thresh"], param["vol_factors"])
+        _, strategy, _ = equity_curves(close, steps[start:], exposures, lag, cost)
+        results.append((strategy[-1]/strategy[0]-1, float(max_drawdown(strategy))))
+    return results
+
+
+# Function to backtest many parameter sets of a strategy on a process pool
+# -> indicators for every swept SMA period are computed once and shared with the workers through shared memory,
+#    all sets are evaluated from the same first day (all their indicators exist), so their results are comparable,
+#    returns a table ranked by total return (ties by smaller drawdown) incl. buy-and-hold for reference
+def sweep(etf: pd.DataFrame, index: pd.DataFrame, vol: Optional[pd.DataFrame], params: List[dict],
+          exposures: Dict[str, float] = STEP_EXPOSURE, lag: int = 1, cost: float = 0.0,
+          max_workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> pd.DataFrame:
+    periods = sorted({param["sma_period"] for param in params})
+    windows = list(dict.fromkeys(window for period in periods for window in signal_sma_windows(period)))
+    with_vol = any(param["vol_thresh"] is not None for param in params)
+    signals = prepare_signals(etf, index, vol if with_vol else None, windows)
+    start = max(first_valid(signals, period, 0 if with_vol else None) for period in periods)
+    if start >= len(signals["etf_close"]): raise ValueError("History is too short for the longest SMA of the sweep")
+
+    # sets of the same period end up in the same chunks
+    order = sorted(range(len(params)), key=lambda idx: params[idx]["sma_period"])
+    chunks = [[params[idx] for idx in order[pos:pos+chunk_size]] for pos in range(0, len(order), chunk_size)]
+    shm, layout = _share(signals)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(shm.name, layout, signals["labels"])) as pool:
+            futures = [pool.submit(_run_chunk, chunk, start, exposures, lag, cost) for chunk in chunks]
+            results = [result for future in futures for result in future.result()]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    table = pd.DataFrame([params[idx] for idx in order])
+    table["total_return"], table["max_drawdown"] = zip(*results) if results else ((), ())
+    close = signals["etf_close"][start:]
+    table.attrs["buy_and_hold"] = {"total_return": close[-1]/close[0]-1, "max_drawdown": float(max_drawdown(close))}
+    table.attrs["start"] = signals["dates"][start]
+    return table.sort_values(["total_return", "max_drawdown"], ascending=False, ignore_index=True)
+
+
+# Main function
+def main(strategy, samples=None, period='25y'):
+    from market_data import price_cache
+    etf_sym, index_sym, vol_sym, default_thresh, default_period = STRATEGIES[strategy]
+    etf = price_cache.history(etf_sym, '1d', period=period)
+    index = price_cache.history(index_sym, '1d', period=period)
+    vol = price_cache.history(vol_sym, '1d', period=period) if vol_sym else None
+
+    if samples: params = random_params(samples, (15, 45) if vol_sym else None)
+    else: params = grid_params(range(20, 41, 2) if vol_sym else [None], [20, 30, 40, 50, 60, 75, 100])
+    table = sweep(etf, index, vol, params)
+    print(f"From {table.attrs['start']:%Y-%m-%d}, buy-and-hold:", table.attrs["buy_and_hold"], "\n")
+    print(table.head(20).to_string())
+
+
+# Run the script
+if __name__ == "__main__":
+    main(argv[1] if len(argv)>1 else "amumbo", int(argv[2]) if len(argv)>2 else None)
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+from typing import Callable, Optional, Sequence, Union
+
+# Percentiles reported for the Monte Carlo bands
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+''' Vectorized Growth Simulation '''
+## Simulate Tax on Dividends (minus annual tax-free Income), getDivs for whole arrays of portfolios
+def taxed_dividends(total_val, total_divy, taxFreeGain, afterTaxMult):
+    yearly_div = total_val*total_divy/100
+    return np.where(yearly_div>taxFreeGain, (yearly_div-taxFreeGain)*afterTaxMult+taxFreeGain, yearly_div)
+
+
+## Simulate Portfolio Growth of many portfolios at once, same yearly steps as growthSimulation
+# -> every parameter may carry leading batch axes (per position parameters end with the positions axis),
+#    growth is the yearly growth in % per position or a function year -> growth (e.g. random draws per path),
+#    returns the value, yield and taxed dividend history (..., years+1), the final positions and the snowball year
+#    (first year without savings, NaN if it is never reached)
+def simulate_growth(years: int, pos, divy, DRIP_alloc, save_alloc, ysr, growth: Union[np.ndarray, Callable],
+                    taxFreeGain, afterTaxMult) -> dict:
+    pos, divy = np.asarray(pos, dtype=float), np.asarray(divy, dtype=float)
+    DRIP_alloc, save_alloc = np.asarray(DRIP_alloc, dtype=float), np.asarray(save_alloc, dtype=float)
+    ysr, taxFreeGain, afterTaxMult = (np.asarray(x, dtype=float) for x in (ysr, taxFreeGain, afterTaxMult))
+    growth_at = growth if callable(growth) else (lambda year: growth)
+
+    val_hist, divy_hist, adiv_hist = list(), list(), list()
+    snowball = np.array(-1)
+    for year in range(years+1):
+        total_val = pos.sum(axis=-1)
+        total_divy = (pos/total_val[..., None]*divy).sum(axis=-1)
+        yearly_div = taxed_dividends(total_val, total_divy, taxFreeGain, afterTaxMult)
+        val_hist.append(total_val)
+        divy_hist.append(total_divy)
+        adiv_hist.append(yearly_div)
+        if year == years: break
+
+        pos = pos + pos*np.asarray(growth_at(year))/100
+        invest = DRIP_alloc*yearly_div[..., None]
+        saving = (yearly_div*0.33<ysr) & (total_val*0.01<ysr)
+        snowball = np.where((snowball<0) & ~saving, year, snowball)
+        pos = pos + np.where(saving[..., None], invest + save_alloc*ysr[..., None], invest)
+
+    shape = pos.shape[:-1]
+    hist = lambda values: np.stack(np.broadcast_arrays(*values), axis=-1).reshape(shape+(years+1,))
+    snowball = np.broadcast_to(snowball, shape)
+    return {"value": hist(val_hist), "yield": hist(divy_hist), "dividends": hist(adiv_hist), "pos": pos,
+            "snowball": np.where(snowball<0, np.nan, snowball)}
+
+
+''' Monte Carlo '''
+# Function to get a correlation matrix from a matrix or a single correlation shared by all position pairs
+def correlation_matrix(corr, positions: int) -> np.ndarray:
+    corr = np.asarray(corr, dtype=float)
+    if corr.ndim == 0: corr = np.full((positions, positions), float(corr)) + (1-corr)*np.eye(positions)
+    return corr
+
+
+# Function to get a sampler of correlated yearly growth rates in % for (paths, positions)
+# -> mean and vol are the expected yearly growth and its standard deviation in % per position,
+#    dist 'lognormal' (growth never below -100%), 'normal' or 't' (fat tails with df degrees of freedom)
+def growth_sampler(paths: int, mean, vol, corr=0.0, dist: str = "lognormal", df: float = 5,
+                   seed: Optional[int] = None) -> Callable:
+    mean, vol = np.asarray(mean, dtype=float)/100, np.broadcast_to(np.asarray(vol, dtype=float)/100, np.shape(mean))
+    chol = np.linalg.cholesky(correlation_matrix(corr, len(mean)))
+    rng = np.random.default_rng(seed)
+    if dist == "lognormal":
+        sigma = np.sqrt(np.log1p(vol**2/(1+mean)**2))
+        mu = np.log1p(mean) - sigma**2/2
+    elif dist not in ("normal", "t"): raise ValueError(f"Unknown distribution '{dist}'")
+
+    def sample(year):
+        z = rng.standard_normal((paths, len(mean))) @ chol.T
+        if dist == "t": z *= np.sqrt((df-2)/rng.chisquare(df, (paths, 1)))  # unit variance multivariate t
+        if dist == "lognormal": return np.expm1(mu + sigma*z)*100
+        return (mean + vol*z)*100
+    return sample
+
+
+# Function to run growthSimulation for many random paths at once and summarize them as percentile bands
+# -> expGrowth/vol are the yearly growth mean and standard deviation per position in %, corr a matrix or one value,
+#    returns DataFrames of the value, taxed dividend and yield bands per year (columns are percentiles), the snowball
+#    year percentiles (over the paths reaching it) and the share of paths never reaching it
+def monte_carlo_growth(years: int, pos, divy, DRIP_alloc, save_alloc, ysr, expGrowth, vol, taxFreeGain, afterTaxMult,
+                       corr=0.0, paths: int = 100_000, dist: str = "lognormal", df: float = 5,
+                       seed: Optional[int] = None, percentiles: Sequence[float] = PERCENTILES) -> dict:
+    sampler = growth_sampler(paths, expGrowth, vol, corr, dist, df, seed)
+    sim = simulate_growth(years, np.broadcast_to(np.asarray(pos, dtype=float), (paths, len(pos))), divy, DRIP_alloc,
+                          save_alloc, ysr, sampler, taxFreeGain, afterTaxMult)
+    bands = lambda values: pd.DataFrame(np.percentile(values, percentiles, axis=0).T, columns=list(percentiles),
+                                        index=pd.RangeIndex(years+1, name="year"))
+    reached = sim["snowball"][~np.isnan(sim["snowball"])]
+    snowball = pd.Series(np.percentile(reached, percentiles) if len(reached) else np.nan, index=list(percentiles))
+    return {"value": bands(sim["value"]), "dividends": bands(sim["dividends"]), "yield": bands(sim["yield"]),
+            "snowball": snowball, "never_snowball": 1-len(reached)/paths}
+
+
+''' Scenario Grid '''
+# Function to evaluate every combination of the given parameter options in one broadcasted simulation
+# -> options are lists (or single values) of monthlySavingsRate, years, tax (in %), taxFreeGain and
+#    save_alloc ({name: allocation} to compare several allocations), the DRIP allocation follows the notebook
+#    ((divCon+save_alloc)/2), returns a tidy table with one row per scenario: its parameters, the final value,
+#    yield and taxed dividends after its years and its snowball year (NaN if not reached within its years)
+def scenario_grid(pos, divy, expGrowth, monthlySavingsRate=1500, years=35, tax=26, taxFreeGain=1200,
+                  save_alloc=None) -> pd.DataFrame:
+    divy = np.asarray(divy, dtype=float)
+    if save_alloc is None: save_alloc = {"current": np.asarray(pos, dtype=float)/np.sum(pos)}
+    elif not isinstance(save_alloc, dict): save_alloc = {"save_alloc": save_alloc}
+    options = {"monthlySavingsRate": monthlySavingsRate, "years": years, "tax": tax, "taxFreeGain": taxFreeGain}
+    options = {key: np.atleast_1d(value) for key, value in options.items()}
+    options["save_alloc"] = np.array(list(save_alloc))
+
+    # one flat axis over all combinations
+    grids = np.meshgrid(*[np.arange(len(value)) for value in options.values()], indexing="ij")
+    table = pd.DataFrame({key: value[grid.ravel()] for (key, value), grid in zip(options.items(), grids)})
+    alloc = np.array([np.asarray(save_alloc[name], dtype=float) for name in table["save_alloc"]])
+    DRIP_alloc = (divy/divy.sum() + alloc)/2
+    horizon = table["years"].to_numpy(dtype=int)
+
+    sim = simulate_growth(int(horizon.max()), pos, divy, DRIP_alloc, alloc, table["monthlySavingsRate"].to_numpy(dtype=float)*12,
+                          expGrowth, table["taxFreeGain"].to_numpy(dtype=float), (100-table["tax"].to_numpy(dtype=float))/100)
+    rows = np.arange(len(table))
+    table["value"] = sim["value"][rows, horizon]
+    table["yield"] = sim["yield"][rows, horizon]
+    table["dividends"] = sim["dividends"][rows, horizon]
+    table["snowball_year"] = np.where(sim["snowball"] < horizon, sim["snowball"], np.nan)
+    return table
@@ -0,0 +1,71 @@
+import json
+import os
+from datetime import date, datetime, timedelta
+import numpy as np
+from typing import List, Optional, Tuple
+
+# Files of the price history cache, readable with numpy alone (market_data.PriceCache wraps them into DataFrames)
+# -> root/prices/<interval>/<symbol>/ holds meta.json (version, columns, tz, start, fetched) and the current
+#    version's index_<version>.npy (int64 UTC nanoseconds) and values_<version>.npy (columns x bars float64)
+
+# Local cache directory (override with the INVEST_TOOL_CACHE environment variable)
+CACHE_DIR = os.environ.get("INVEST_TOOL_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "invest_tool"))
+
+# Stored bars newer than this are served without asking the provider
+MAX_AGE = timedelta(hours=6)
+
+
+# helper function to translate yfinance periods like '2y' or '6mo' into a start date
+def period_start(period: str, today: Optional[date] = None) -> str:
+    today = today or date.today()
+    units = {"d": 1, "wk": 7, "mo": 31, "y": 365}
+    for unit, days in units.items():
+        if period.endswith(unit) and period[:-len(unit)].isdigit():
+            return str(today-timedelta(days=int(period[:-len(unit)])*days))
+    raise ValueError(f"Unsupported period '{period}'")
+
+
+# Function to get the directory of the stored bars of a symbol
+def price_dir(root: str, symbol: str, interval: str) -> str:
+    return os.path.join(root, "prices", interval, symbol.replace("/", "_"))
+
+
+# Function to read the meta.json of a symbol directory (None if nothing is stored)
+def read_meta(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(path, "meta.json")) as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+
+# Function to read the current index and values files of a symbol directory memory-mapped
+def read_bars(path: str, meta: dict) -> Tuple[np.ndarray, np.ndarray]:
+    version = meta["version"]
+    return (np.load(os.path.join(path, f"index_{version}.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, f"values_{version}.npy"), mmap_mode="r"))
+
+
+# helper function to get the calendar dates ('YYYY-MM-DD') of UTC nanoseconds in a time zone (None for naive bars)
+def _local_dates(index: np.ndarray, tz: Optional[str]) -> List[str]:
+    if tz is None: return np.asarray(index).view("datetime64[ns]").astype("datetime64[D]").astype(str).tolist()
+    from zoneinfo import ZoneInfo
+    zone = ZoneInfo(tz)
+    return [datetime.fromtimestamp(int(ns)//10**9, zone).date().isoformat() for ns in index]
+
+
+# Function to get the stored closes of a symbol from the start date on and their calendar dates without pandas
+# -> returns None whenever PriceCache.history would ask the provider (nothing stored, start not covered or older
+#    than max_age) or the time zone is unknown to zoneinfo, the caller then goes through PriceCache
+def cached_closes(symbol: str, interval: str = "1d", start: Optional[str] = None, root: str = CACHE_DIR,
+                  max_age: timedelta = MAX_AGE) -> Optional[Tuple[np.ndarray, List[str]]]:
+    path = price_dir(root, symbol, interval)
+    meta = read_meta(path)
+    if meta is None or "Close" not in meta["columns"]: return None
+    if start is not None and (meta["start"] is None or start < meta["start"]): return None
+    if datetime.now()-datetime.fromisoformat(meta["fetched"]) > max_age: return None
+    try:
+        index, values = read_bars(path, meta)
+        dates = _local_dates(index, meta["tz"])
+    except (OSError, ValueError, KeyError): return None  # zoneinfo's unknown zones are KeyErrors
+    if not len(dates): return None
+    lo = int(np.searchsorted(np.array(dates), start)) if start is not None else 0
+    return np.asarray(values[meta["columns"].index("Close"), lo:]), dates[lo:]
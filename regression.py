@@ -0,0 +1,159 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import List, Sequence
+
+# relative singular value cutoff, same as sklearn's LinearRegression(tol=1e-6) on dense data
+LSTSQ_RCOND = 1e-6
+
+
+# Function to get all lag windows of (stacked) series as zero-copy view (row idx = values[..., idx:idx+timing])
+def lag_windows(values: np.ndarray, timing: int) -> np.ndarray:
+    return sliding_window_view(values, timing, axis=-1)
+
+
+# Function to get the lag windows used for forecasting beyond the end of the series
+# -> window of step s starts at values[-timing+s] and wraps around to the series start like iloc does
+def future_lag_windows(values: np.ndarray, timing: int, steps: Sequence[int]) -> np.ndarray:
+    n = values.shape[-1]
+    start, stop = min(steps), max(steps)
+    wrapped = np.take(values, np.arange(n-timing+start, n+stop), axis=-1, mode='wrap')
+    return lag_windows(wrapped, timing)[..., np.asarray(steps)-start, :]
+
+
+# Function to fit ordinary least squares models with intercept (same solution as sklearn's LinearRegression)
+# -> X is (..., rows, features) and y is (..., rows), all stacked problems are solved in one call
+def fit_linear(X: np.ndarray, y: np.ndarray):
+    X_offset, y_offset = X.mean(axis=-2), y.mean(axis=-1)
+    X_pinv = np.linalg.pinv(X-X_offset[..., None, :], rcond=LSTSQ_RCOND)
+    coef = (X_pinv @ (y-y_offset[..., None])[..., None])[..., 0]
+    return coef, y_offset - (X_offset[..., None, :] @ coef[..., None])[..., 0, 0]
+
+
+# Function to find the well conditioned systems among stacked symmetric positive semi-definite matrices
+# -> largest eigenvalue <= trace and smallest >= 1/||inv||_F, so these provably lose nothing to the lstsq cutoff
+def well_conditioned(cov: np.ndarray) -> np.ndarray:
+    trace = np.trace(cov, axis1=-2, axis2=-1)
+    good = trace>0
+    if good.any():
+        jitter = trace[good]*1e-14
+        inv = np.linalg.inv(cov[good] + jitter[..., None, None]*np.eye(cov.shape[-1]))
+        good[good] = 1/np.linalg.norm(inv, axis=(-2,-1)) - jitter > trace[good]*LSTSQ_RCOND**2*100
+    return good
+
+
+# Function to solve the normal equations cov @ coef = rhs of stacked least-squares problems
+# -> well conditioned systems are solved directly, only the others need the slow truncated pseudo-inverse
+def solve_normal_equations(cov: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+    good = well_conditioned(cov)
+    coef = np.empty(rhs.shape)
+    coef[good] = np.linalg.solve(cov[good], rhs[good][..., None])[..., 0]
+    if not good.all():
+        cov_pinv = np.linalg.pinv(cov[~good], rcond=LSTSQ_RCOND**2, hermitian=True)
+        coef[~good] = (cov_pinv @ rhs[~good][..., None])[..., 0]
+    return coef
+
+
+# Function to fit underdetermined least-squares problems (fewer rows than features) in their row space
+# -> min-norm solution X^T (X X^T)^+ y, centred rows sum to zero so adding the all-ones direction to X X^T
+#    makes it invertible without changing the solution
+def fit_linear_dual(X: np.ndarray, y: np.ndarray):
+    X_offset, y_offset = X.mean(axis=-2), y.mean(axis=-1)
+    X_centred, y_centred = X-X_offset[..., None, :], y-y_offset[..., None]
+    kernel = X_centred @ np.swapaxes(X_centred, -1, -2)
+    kernel += (np.trace(kernel, axis1=-2, axis2=-1)/X.shape[-2])[..., None, None]
+
+    good = well_conditioned(kernel)
+    coef = np.empty(X_offset.shape)
+    alpha = np.linalg.solve(kernel[good], y_centred[good][..., None])
+    coef[good] = (np.swapaxes(X_centred[good], -1, -2) @ alpha)[..., 0]
+    if not good.all():
+        coef[~good] = (np.linalg.pinv(X_centred[~good], rcond=LSTSQ_RCOND) @ y_centred[~good][..., None])[..., 0]
+    return coef, y_offset - (X_offset[..., None, :] @ coef[..., None])[..., 0, 0]
+
+
+# Function to fit a linear model with intercept from a Gram matrix of rows [features..., target, 1]
+# -> centred normal equations, cutoff is squared as the eigenvalues of X^T X are squared singular values of X
+def fit_linear_gram(gram: np.ndarray):
+    k = gram.shape[-1]-2
+    count = gram[..., -1, -1]
+    mean = gram[..., -1, :-1] / count[..., None]
+    cov = gram[..., :-1, :-1] - count[..., None, None] * mean[..., :, None] * mean[..., None, :]
+    coef = solve_normal_equations(cov[..., :k, :k], cov[..., :k, k])
+    return coef, mean[..., k] - (mean[..., None, :k] @ coef[..., None])[..., 0, 0]
+
+
+# Function to get the Gram matrices of the lag window regressions of every timing (rows [window..., target, 1])
+# -> the t-window of a target is the tail of its longest window, so every smaller timing reuses the trailing
+#    block of the previous cross-products and only adds the rows its shorter history makes available
+def nested_window_grams(shifted: np.ndarray, timings: List[int]) -> dict:
+    n = shifted.shape[-1]
+    grams, gram, prev = dict(), None, n
+    for timing in sorted(set(timings), reverse=True):
+        windows = lag_windows(shifted, timing)[..., :prev-timing, :]
+        targets = shifted[..., timing:prev, None]
+        rows = np.concatenate([windows, targets, np.ones_like(targets)], axis=-1)
+        added = np.swapaxes(rows, -1, -2) @ rows
+        gram = added if gram is None else gram[..., prev-timing:, prev-timing:] + added
+        grams[timing] = gram
+        prev = timing
+    return grams
+
+
+# Function to fit the lag window model of every timing from its Gram matrix (see nested_window_grams)
+# -> timings with fewer rows than features are fitted in their row space instead, intercepts are shifted back
+def window_models(shifted: np.ndarray, shift: np.ndarray, grams: dict) -> dict:
+    n = shifted.shape[-1]
+    models = dict()
+    for timing, gram in grams.items():
+        if n-timing <= timing: coef, intercept = fit_linear_dual(lag_windows(shifted, timing)[..., :n-timing, :], shifted[..., timing:])
+        else: coef, intercept = fit_linear_gram(gram)
+        models[timing] = (coef, intercept + shift[..., 0]*(1-coef.sum(axis=-1)))
+    return models
+
+
+# Function to fit one lag window model per timing from one shared Gram matrix
+def fit_nested_windows(values: np.ndarray, timings: List[int]) -> dict:
+    # shift series to zero mean to keep the cross-products well conditioned (OLS with intercept is shift invariant)
+    shift = values.mean(axis=-1, keepdims=True)
+    shifted = values - shift
+    return window_models(shifted, shift, nested_window_grams(shifted, timings))
+
+
+# Function to predict with fitted linear model(s) for a whole matrix of inputs at once
+def predict_linear(X: np.ndarray, model) -> np.ndarray:
+    coef, intercept = model
+    return (X @ coef[..., None])[..., 0] + intercept[..., None]
+
+
+# Function to fit the second and third layer of the stacked regressor on fitted lag window models and forecast the
+# given steps, values are equally long series (batch, months)
+def stacked_forecast(values: np.ndarray, models: dict, timings: List[int], repeat: int, steps: Sequence[int]) -> np.ndarray:
+    n, depth = values.shape[-1], max(timings)
+    train_feats, future_feats = list(), list()
+    for timing in timings:
+        windows, model = lag_windows(values, timing), models[timing]
+        train_feats.append(predict_linear(windows[..., depth-timing:n-timing, :], model))
+        future_feats.append(predict_linear(future_lag_windows(values, timing, steps), model))
+    train_feats, future_feats = np.stack(train_feats, axis=-1), np.stack(future_feats, axis=-1)
+
+    # second layer: merge all depths
+    y = values[..., depth:]
+    layer_two = fit_linear(train_feats, y)
+
+    # general model using all repeated versions of the second layer
+    X = np.repeat(predict_linear(train_feats, layer_two)[..., None], repeat, axis=-1)
+    general = fit_linear(X, y)
+    X_future = np.repeat(predict_linear(future_feats, layer_two)[..., None], repeat, axis=-1)
+    return predict_linear(X_future, general)
+
+
+# Function to fit the stacked three layer regressor on equally long series (batch, months) and forecast the given steps
+# -> first layer: one model per timing trained on all lag windows of the series,
+#    the repeated models of a layer are fitted on identical data, so each layer is only solved once
+def batch_three_layer_forecast(values: np.ndarray, timings: List[int], repeat: int, steps: Sequence[int]) -> np.ndarray:
+    return stacked_forecast(values, fit_nested_windows(values, timings), timings, repeat, steps)
+
+
+# Function to fit the stacked three layer regressor on a single series
+def three_layer_forecast(values: np.ndarray, timings: List[int], repeat: int, steps: Sequence[int]) -> np.ndarray:
+    return batch_three_layer_forecast(values[None], timings, repeat, steps)[0]
@@ -0,0 +1,208 @@
+import ast
+from functools import lru_cache
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from signal_stream import LADDER_STEPS, M75_WINDOWS, VOL_FACTORS, ladder_sma_labels, signal_sma_windows
+
+# Rule language: Python expressions over named variables (e.g. "index.close < 0.98*index.sma200 and not high_vol")
+# -> and/or/not, comparisons (chained too), + - * /, numbers, True/False, min()/max() (NaNs are skipped unless
+#    all values are NaN) and abs(), names are params (fixed when compiling), definitions or variables (arrays or
+#    floats given when evaluating, all broadcast against each other, e.g. (instruments, days))
+_COMPARE = {ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+            ast.Eq: np.equal, ast.NotEq: np.not_equal}
+_ARITH = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+_BOOL = {ast.And: np.logical_and, ast.Or: np.logical_or}
+_FUNCS = {"min": np.fmin, "max": np.fmax}
+
+
+# helper function to get the dotted name of a Name or Attribute node (e.g. 'index.sma200')
+def _dotted(node) -> Optional[str]:
+    if isinstance(node, ast.Name): return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted(node.value)
+        return f"{base}.{node.attr}" if base else None
+    return None
+
+
+# Compiler of rule expressions into one flat program of numpy operations over value slots
+# -> identical subexpressions of all rules share one slot (so every comparison is evaluated once per pass),
+#    operations on constants only are folded while compiling
+class _Compiler:
+    def __init__(self, params: dict, definitions: Dict[str, str]):
+        self.params = params
+        self.definitions = definitions
+        self.values: List[object] = list()      # constants, None for slots computed when evaluating
+        self.inputs: Dict[str, int] = dict()    # variable name -> slot
+        self.program: List[tuple] = list()      # (slot, ufunc, argument slots)
+        self.slots: Dict[str, int] = dict()     # expression key -> slot
+        self.resolving: List[str] = list()      # definitions being compiled (to detect cycles)
+
+    def _slot(self, key: str, value=None) -> int:
+        self.slots[key] = len(self.values)
+        self.values.append(value)
+        return self.slots[key]
+
+    def _constant(self, value) -> int:
+        key = f"const:{value!r}"
+        return self.slots[key] if key in self.slots else self._slot(key, value)
+
+    def _op(self, fn, args: Sequence[int]) -> int:
+        key = f"{fn.__name__}({','.join(map(str, args))})"
+        if key in self.slots: return self.slots[key]
+        if all(self.values[arg] is not None for arg in args):
+            return self._constant(fn(*(self.values[arg] for arg in args)))
+        slot = self._slot(key)
+        self.program.append((slot, fn, tuple(args)))
+        return slot
+
+    # Function to compile the expression text of a rule, returns its slot
+    def compile(self, text: str) -> int:
+        try: tree = ast.parse(text.strip(), mode="eval")
+        except SyntaxError as err: raise ValueError(f"Invalid rule '{text}': {err.msg}") from None
+        return self._node(tree.body, text)
+
+    def _name(self, name: str, text: str) -> int:
+        if name in ("True", "False"): return self._constant(name == "True")
+        if name in self.params: return self._constant(self.params[name])
+        if name in self.definitions:
+            if name in self.resolving: raise ValueError(f"Definition '{name}' refers to itself")
+            key = f"def:{name}"
+            if key not in self.slots:
+                self.resolving.append(name)
+                self.slots[key] = self.compile(self.definitions[name])
+                self.resolving.pop()
+            return self.slots[key]
+        if name not in self.inputs: self.inputs[name] = self._slot(f"var:{name}")
+        return self.inputs[name]
+
+    def _node(self, node, text: str) -> int:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (bool, int, float)):
+            return self._constant(node.value)
+        name = _dotted(node)
+        if name is not None: return self._name(name, text)
+        if isinstance(node, ast.BoolOp):
+            slots = [self._node(value, text) for value in node.values]
+            slot = slots[0]
+            for other in slots[1:]: slot = self._op(_BOOL[type(node.op)], (slot, other))
+            return slot
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return self._op(np.logical_not, (self._node(node.operand, text), ))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return self._op(np.negative, (self._node(node.operand, text), ))
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITH:
+            return self._op(_ARITH[type(node.op)], (self._node(node.left, text), self._node(node.right, text)))
+        if isinstance(node, ast.Compare) and all(type(op) in _COMPARE for op in node.ops):
+            # a < b < c is (a < b) and (b < c)
+            operands = [self._node(operand, text) for operand in [node.left]+node.comparators]
+            slots = [self._op(_COMPARE[type(op)], (left, right)) for op, left, right in zip(node.ops, operands, operands[1:])]
+            slot = slots[0]
+            for other in slots[1:]: slot = self._op(np.logical_and, (slot, other))
+            return slot
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            args = [self._node(arg, text) for arg in node.args]
+            if node.func.id == "abs" and len(args) == 1: return self._op(np.abs, args)
+            if node.func.id in _FUNCS and args:
+                slot = args[0]
+                for other in args[1:]: slot = self._op(_FUNCS[node.func.id], (slot, other))
+                return slot
+        raise ValueError(f"Unsupported expression '{ast.unparse(node)}' in rule '{text}'")
+
+
+# Compiled rule set: outcomes in priority order (the first rule that holds decides, default if none does)
+# and flags evaluated next to them, all in one pass over the variables
+# -> rules are (outcome, condition) pairs, definitions are named expressions rules can refer to,
+#    params are constants fixed when compiling (e.g. thresholds)
+class RuleSet:
+    def __init__(self, rules: Sequence[Tuple[str, str]], default: str, definitions: Optional[Dict[str, str]] = None,
+                 flags: Optional[Dict[str, str]] = None, params: Optional[dict] = None):
+        compiler = _Compiler(dict(params or dict()), dict(definitions or dict()))
+        self.outcomes = tuple(outcome for outcome, _ in rules) + (default, )
+        self.rules = [compiler.compile(condition) for _, condition in rules]
+        self.flags = {name: compiler.compile(condition) for name, condition in (flags or dict()).items()}
+        self.values = compiler.values
+        self.inputs = compiler.inputs
+        self.program = compiler.program
+
+    # Function to get the names of the variables the rules read
+    def variables(self) -> List[str]:
+        return list(self.inputs)
+
+    # Function to run the program, returns the values of all slots and the shape every result is broadcast to
+    def _run(self, variables: Dict[str, object]):
+        missing = [name for name in self.inputs if name not in variables]
+        if missing: raise ValueError(f"Missing rule variables {missing}")
+        values = list(self.values)
+        for name, slot in self.inputs.items(): values[slot] = np.asarray(variables[name])
+        shape = np.broadcast_shapes(*(values[slot].shape for slot in self.inputs.values()))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for slot, fn, args in self.program: values[slot] = fn(*(values[arg] for arg in args))
+        return values, shape
+
+    # Function to get the condition of every rule and the flags as boolean arrays of the variables' shape
+    def masks(self, variables: Dict[str, object]):
+        values, shape = self._run(variables)
+        return ([np.broadcast_to(np.asarray(values[slot], dtype=bool), shape) for slot in self.rules],
+                {name: np.broadcast_to(np.asarray(values[slot], dtype=bool), shape) for name, slot in self.flags.items()})
+
+    # Function to evaluate the rules, returns (outcome numbers into self.outcomes, flags)
+    def evaluate(self, variables: Dict[str, object]):
+        masks, flags = self.masks(variables)
+        return np.select(masks, np.arange(len(masks)), default=len(masks)), flags
+
+    # Function to get the outcome name of float variables (e.g. the latest bar), returns (outcome, flags)
+    def decide(self, variables: Dict[str, float]):
+        outcomes, flags = self.evaluate(variables)
+        return self.outcomes[int(outcomes)], {name: bool(flag) for name, flag in flags.items()}
+
+
+''' Decision Ladder '''
+# Decision ladder of the strategy helpers' check_signals in the order it is tested, {index_smas}/{etf_smas} are
+# filled with the instrument's SMAs of all windows
+LADDER_RULES = ((LADDER_STEPS[0], "high_vol and index.close < index.sma200"),
+                (LADDER_STEPS[1], "high_vol"),
+                (LADDER_STEPS[2], "index.close < index.sma200"),
+                (LADDER_STEPS[3], "index.close < index.sma150"),
+                (LADDER_STEPS[4], "index.close < index.smaq"),
+                (LADDER_STEPS[5], "index.close < index.sma50"),
+                (LADDER_STEPS[6], "index.close < max({index_smas})"),
+                (LADDER_STEPS[7], "high_vol and etf.close < etf.sma200"),
+                (LADDER_STEPS[8], "etf.close < etf.sma200"),
+                (LADDER_STEPS[9], "etf.close < etf.sma150"),
+                (LADDER_STEPS[10], "etf.close < etf.smaq"),
+                (LADDER_STEPS[11], "etf.close < etf.sma50"),
+                (LADDER_STEPS[12], "etf.close < max({etf_smas})"))
+LADDER_FLAGS = {"add_hint": "not high_vol and (index.smaq < index.close < index.sma50 or etf.smaq < etf.close < etf.sma50)"}
+
+
+# Function to get the compiled decision ladder of an SMA period (compiled once per SMA period and volatility factors)
+# -> the threshold is the variable vol_thresh, so sweeps over thresholds share one ladder,
+#    without volatility the volatility never counts as high
+@lru_cache(maxsize=256)
+def ladder_rules(sma_period: int, volatility: bool = False, vol_factors: Tuple[float, ...] = VOL_FACTORS) -> RuleSet:
+    windows = signal_sma_windows(sma_period)
+    smas = {name: ", ".join(f"{name}.sma{window}" for window in windows) for name in ("index", "etf")}
+    rules = [(step, condition.format(index_smas=smas["index"], etf_smas=smas["etf"])) for step, condition in LADDER_RULES]
+    if not volatility: high_vol = "False"
+    else: high_vol = " or ".join(["vol > vol_thresh"]+[f"vol.m75_{window} > {factor}*vol_thresh"
+                                                         for window, factor in zip(M75_WINDOWS, vol_factors)])
+    return RuleSet(rules, LADDER_STEPS[-1], {"high_vol": high_vol}, LADDER_FLAGS)
+
+
+# Function to get the variables of the ladder from prepared signals (see backtest.prepare_signals)
+# -> SMA rows may hold any further axes (e.g. (windows, instruments, days)), the SMA150, quarter SMA and SMA50
+#    are found like in check_signals and are 0 if there is no match, vol_thresh may be an array broadcast
+#    against them as well
+def ladder_variables(signals: dict, sma_period: int, vol_thresh=None) -> Dict[str, object]:
+    labels = [f'SMA{window}' for window in signal_sma_windows(sma_period)]
+    aliases = dict(zip(("sma150", "smaq", "sma50"), ladder_sma_labels(labels)))
+    variables = dict()
+    for name in ("index", "etf"):
+        smas = {label: signals[f"{name}_smas"][signals["labels"].index(label)] for label in labels}
+        variables[f"{name}.close"] = signals[f"{name}_close"]
+        variables.update({f"{name}.{label.lower()}": sma for label, sma in smas.items()})
+        variables.update({f"{name}.{alias}": smas[label] if label else 0.0 for alias, label in aliases.items()})
+    if "vol" in signals:
+        variables["vol"] = signals["vol"]
+        variables.update({f"vol.m75_{window}": m75 for window, m75 in zip(M75_WINDOWS, signals["m75s"])})
+    if vol_thresh is not None: variables["vol_thresh"] = vol_thresh
+    return variables
@@ -0,0 +1,190 @@
+import json
+import os
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from indicators import RunningMeans, RollingQuantiles
+
+# Parameters of the strategy helpers' check_signals
+M75_WINDOWS = (7, 14, 30)         # week, 14d and month M75 support of the volatility index
+VOL_FACTORS = (0.9, 0.8, 0.75)    # share of the threshold each M75 window may reach before volatility counts as high
+
+# Steps of the decision ladder in the order check_signals tests them
+LADDER_STEPS = ("high_volatility_index_below_sma200",
+                "high_volatility",
+                "index_below_sma200",
+                "index_below_sma150",
+                "index_below_smaq",
+                "index_below_sma50",
+                "index_below_sma",
+                "high_volatility_etf_below_sma200",
+                "etf_below_sma200",
+                "etf_below_sma150",
+                "etf_below_smaq",
+                "etf_below_sma50",
+                "etf_below_sma",
+                "stable")
+
+# Strategies of the helpers as (ETF, index, volatility index, default threshold, default sma period)
+STRATEGIES = {"amumbo": ("18MF.DE", "^GSPC", "^VIX", 28, 50),
+              "jeqp": ("JEQP.DE", "^NDX", "^VXN", 33, 50),
+              "lvdx": ("LVDX.DE", "^GDAXI", None, None, 50)}
+
+# Strategy helper module of every strategy (only imported to print their warnings and plot)
+HELPERS = {"amumbo": "amumbo_strat_helper", "jeqp": "jeqp_strat_helper", "lvdx": "lvdx_strat_helper"}
+
+# Share of the ETF position held after each ladder step (the rest is kept as cash)
+# -> "sell completely" = 0, "move 50%" = 0.5, "move 25%" = 0.75, stop saving plan or attention notes keep the position
+STEP_EXPOSURE = {"high_volatility_index_below_sma200": 0.0,
+                 "high_volatility": 0.5,
+                 "index_below_sma200": 0.0,
+                 "index_below_sma150": 0.5,
+                 "index_below_smaq": 0.75,
+                 "index_below_sma50": 1.0,
+                 "index_below_sma": 1.0,
+                 "high_volatility_etf_below_sma200": 0.0,
+                 "etf_below_sma200": 0.0,
+                 "etf_below_sma150": 0.5,
+                 "etf_below_smaq": 0.75,
+                 "etf_below_sma50": 1.0,
+                 "etf_below_sma": 1.0,
+                 "stable": 1.0}
+
+
+# Function to get the SMA periods check_signals calculates for the index and the ETF
+def signal_sma_windows(sma_period: int) -> List[int]:
+    return list(dict.fromkeys([200, sma_period, 31, 92, 150, 365]))
+
+
+# Function to get the labels check_signals reads its SMA150, quarter SMA and SMA50 from (None if there is no match)
+# -> same substring search over the SMA columns, so e.g. an sma_period of 250 serves as SMA50 like before
+def ladder_sma_labels(labels: Sequence[str]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    sma150, smaq, sma50 = (None, None, None)
+    for label in labels:
+        if '150' in label: sma150 = label
+        elif '92' in label: smaq = label
+        elif '50' in label: sma50 = label
+    return sma150, smaq, sma50
+
+
+# Function to check whether the volatility index counts as high
+# -> vol and m75s (one per M75 window) can be floats or equally long arrays
+def high_volatility(vol, m75s: Sequence, vol_thresh: float, vol_factors: Sequence[float] = VOL_FACTORS):
+    high = np.greater(vol, vol_thresh)
+    for m75, factor in zip(m75s, vol_factors):
+        high = np.logical_or(high, np.greater(m75, vol_thresh*factor))
+    return high
+
+
+# Function to get the conditions of an instrument from its price and SMAs {label: value} (floats or equally long arrays)
+def instrument_conditions(price, smas: Dict[str, object]) -> dict:
+    sma150, smaq, sma50 = (smas[label] if label else 0 for label in ladder_sma_labels(list(smas)))
+    return {"below_sma200": np.less(price, smas['SMA200']),
+            "below_sma150": np.less(price, sma150),
+            "below_smaq": np.less(price, smaq),
+            "above_smaq": np.greater(price, smaq),
+            "below_sma50": np.less(price, sma50),
+            "below_sma": np.logical_or.reduce([np.less(price, sma) for sma in smas.values()])}
+
+
+# Function to get the conditions of all ladder steps (pairs of step and condition) and the add-to-position hint
+# -> works on floats for the latest bar as well as on arrays of whole histories (e.g. np.select for backtests)
+def ladder_conditions(high_vol, index: dict, etf: dict):
+    calm = np.logical_not(high_vol)
+    steps = [(LADDER_STEPS[0], np.logical_and(high_vol, index["below_sma200"])),
+             (LADDER_STEPS[1], high_vol),
+             (LADDER_STEPS[2], index["below_sma200"]),
+             (LADDER_STEPS[3], index["below_sma150"]),
+             (LADDER_STEPS[4], index["below_smaq"]),
+             (LADDER_STEPS[5], index["below_sma50"]),
+             (LADDER_STEPS[6], index["below_sma"]),
+             (LADDER_STEPS[7], np.logical_and(high_vol, etf["below_sma200"])),
+             (LADDER_STEPS[8], etf["below_sma200"]),
+             (LADDER_STEPS[9], etf["below_sma150"]),
+             (LADDER_STEPS[10], etf["below_smaq"]),
+             (LADDER_STEPS[11], etf["below_sma50"]),
+             (LADDER_STEPS[12], etf["below_sma"])]
+    hint = np.logical_or(np.logical_and.reduce([index["above_smaq"], index["below_sma50"], calm]),
+                         np.logical_and.reduce([etf["above_smaq"], etf["below_sma50"], calm]))
+    return steps, hint
+
+
+# Function to walk the ladder for the latest bar, returns (step, hint)
+def decide(high_vol: bool, index: dict, etf: dict) -> Tuple[str, bool]:
+    steps, hint = ladder_conditions(high_vol, index, etf)
+    for step, condition in steps:
+        if condition: return step, bool(hint)
+    return LADDER_STEPS[-1], bool(hint)
+
+
+''' Streaming Signal State '''
+# State of check_signals that is updated one bar at a time instead of recomputed from the whole history
+# -> series are 'index', 'etf' and 'vol' (only with a vol_thresh), they may update independently as their
+#    exchanges close at different times, a bar with the same date as the latest one revises it in place,
+#    only the last bars of the longest window are kept and saved
+class SignalState:
+    def __init__(self, sma_period: int, vol_thresh: Optional[float] = None, vol_factors: Sequence[float] = VOL_FACTORS):
+        self.sma_period = sma_period
+        self.vol_thresh = vol_thresh
+        self.vol_factors = list(vol_factors)
+        windows = signal_sma_windows(sma_period)
+        self.labels = [f'SMA{window}' for window in windows]
+        self.engines = {"index": RunningMeans(windows), "etf": RunningMeans(windows)}
+        if vol_thresh is not None: self.engines["vol"] = RollingQuantiles(M75_WINDOWS, [0.75])
+        self.latest = {name: None for name in self.engines}  # (price, indicator values)
+        self.dates = {name: None for name in self.engines}
+
+    # Function to add the bar of a series, returns the current (step, hint)
+    def update(self, name: str, close: float, date: Optional[str] = None) -> Tuple[str, bool]:
+        engine = self.engines[name]
+        if date is not None and date == self.dates[name]: values = engine.revise(close)
+        else: values = engine.update(close)
+        self.latest[name] = (float(close), np.ravel(values))
+        self.dates[name] = date
+        return self.decision()
+
+    # Function to add the closes of whole histories (only the bars still inside the longest window are replayed)
+    def feed(self, name: str, closes: Sequence[float], dates: Optional[Sequence] = None):
+        keep = self.engines[name].recent.maxlen
+        closes = list(closes)[-keep:]
+        dates = [None]*len(closes) if dates is None else [str(date) for date in list(dates)[-keep:]]
+        for close, date in zip(closes, dates):
+            values = self.engines[name].update(close)
+            self.latest[name] = (float(close), np.ravel(values))
+            self.dates[name] = date
+
+    # Function to get the conditions of the latest bars
+    def conditions(self):
+        if any(latest is None for latest in self.latest.values()): raise ValueError("Every series needs at least one bar")
+        index, etf = ({label: value for label, value in zip(self.labels, self.latest[name][1])} for name in ("index", "etf"))
+        index = instrument_conditions(self.latest["index"][0], index)
+        etf = instrument_conditions(self.latest["etf"][0], etf)
+        if self.vol_thresh is None: return False, index, etf
+        vol, m75s = self.latest["vol"]
+        return high_volatility(vol, m75s, self.vol_thresh, self.vol_factors), index, etf
+
+    # Function to walk the decision ladder for the latest bars, returns (step, hint)
+    def decision(self) -> Tuple[str, bool]:
+        if any(latest is None for latest in self.latest.values()): return None, False
+        return decide(*self.conditions())
+
+    def to_dict(self) -> dict:
+        return {"sma_period": self.sma_period, "vol_thresh": self.vol_thresh, "vol_factors": self.vol_factors,
+                "series": {name: {"recent": list(engine.recent), "date": self.dates[name]}
+                           for name, engine in self.engines.items()}}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "SignalState":
+        signals = cls(state["sma_period"], state["vol_thresh"], state["vol_factors"])
+        for name, series in state["series"].items():
+            signals.feed(name, series["recent"])
+            signals.dates[name] = series["date"]
+        return signals
+
+    # Function to save the state as json (written atomically so a crash never leaves a broken file)
+    def save(self, path: str):
+        with open(path+".tmp", "w") as f: json.dump(self.to_dict(), f)
+        os.replace(path+".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "SignalState":
+        with open(path) as f: return cls.from_dict(json.load(f))
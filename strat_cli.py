@@ -0,0 +1,101 @@
+import time
+_START = time.perf_counter()  # only used where the process start time is unknown
+import argparse
+import json
+import os
+import sys
+from signal_stream import HELPERS
+
+# Startup budget: seconds from the process start (interpreter and imports included) until the check can read its data
+STARTUP_BUDGET = 1.0
+
+
+# Function to get the seconds since the process started, from /proc on Linux (interpreter startup included)
+# -> elsewhere the seconds since this module was imported
+def process_seconds() -> float:
+    try:
+        with open("/proc/self/stat") as f: started = int(f.read().rsplit(")", 1)[1].split()[19])
+        return time.clock_gettime(time.CLOCK_BOOTTIME)-started/os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError): return time.perf_counter()-_START
+
+
+# Function to check the latest signals of a strategy without its helper (no matplotlib, no plots)
+# -> the ladder is walked by the streaming SignalState on the last bars of the cached histories, which gives the same
+#    step as check_signals, returns the decision with the latest closes, the dates of the bars and the stage timings
+# -> up to date cached histories are read with numpy alone, pandas and the provider are only imported to fetch
+def latest_decision(strategy: str, vol_thresh=None, sma_period=None, period: str = "2y", cache=None) -> dict:
+    started = time.perf_counter()
+    from price_files import CACHE_DIR, MAX_AGE, cached_closes, period_start
+    from signal_stream import STEP_EXPOSURE, STRATEGIES, SignalState
+    imported = time.perf_counter()
+
+    etf_sym, index_sym, vol_sym, default_thresh, default_period = STRATEGIES[strategy]
+    vol_thresh = (vol_thresh if vol_thresh is not None else default_thresh) if vol_sym else None
+    sma_period = sma_period if sma_period is not None else default_period
+    symbols = {"etf": etf_sym, "index": index_sym, **({"vol": vol_sym} if vol_sym else dict())}
+    start = period_start(period)
+    root, max_age = (cache.root, cache.max_age) if cache is not None else (CACHE_DIR, MAX_AGE)
+    closes = {name: cached_closes(sym, '1d', start, root, max_age) for name, sym in symbols.items()}
+    missing = {name: sym for name, sym in symbols.items() if closes[name] is None}
+    if missing:
+        from market_data import fetch_concurrently, price_cache
+        cache = cache or price_cache
+        fetched, failed = fetch_concurrently({name: (cache.history, (sym, '1d', None, None, period)) for name, sym in missing.items()})
+        if failed: raise next(iter(failed.values()))
+        closes.update({name: (bars['Close'].to_numpy(), bars.index.date) for name, bars in fetched.items()})
+    loaded = time.perf_counter()
+
+    state = SignalState(sma_period, vol_thresh)
+    for name, (values, dates) in closes.items(): state.feed(name, values, dates)
+    step, hint = state.decision()
+    return {"strategy": strategy, "step": step, "exposure": STEP_EXPOSURE[step], "add_hint": hint,
+            "sma_period": sma_period, "vol_thresh": vol_thresh,
+            "latest": {symbols[name]: {"date": state.dates[name], "close": state.latest[name][0]} for name in symbols},
+            "timings": {"import": imported-started, "fetch": loaded-imported, "decide": time.perf_counter()-loaded}}
+
+
+# Main function
+# -> without --no-plot/--json the helper runs as before (printed warnings and plots),
+#    returns 2 if the startup took longer than --budget
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description="Check the signals of a leveraged ETF strategy")
+    parser.add_argument("strategy", choices=list(HELPERS))
+    parser.add_argument("vol_thresh", nargs="?", type=int, help="volatility index threshold (strategy default if omitted)")
+    parser.add_argument("sma_period", nargs="?", type=int, help="SMA period (strategy default if omitted)")
+    parser.add_argument("--no-plot", action="store_true", help="only print the decision")
+    parser.add_argument("--json", action="store_true", help="print the decision as JSON (implies --no-plot)")
+    parser.add_argument("--period", default="2y", help="history to load (default: 2y like the helpers)")
+    parser.add_argument("--budget", type=float, help=f"fail with exit code 2 if the startup takes longer (e.g. {STARTUP_BUDGET})")
+    options = parser.parse_args(args)
+    # lvdx has no volatility index, its only positional option is the SMA period like in its helper
+    if options.strategy == "lvdx" and options.sma_period is None: options.vol_thresh, options.sma_period = None, options.vol_thresh
+
+    if not (options.no_plot or options.json):
+        import importlib
+        helper = importlib.import_module(HELPERS[options.strategy])
+        # options left out take the helper's defaults (an explicit 0 is kept like in latest_decision)
+        sma_period = options.sma_period if options.sma_period is not None else helper.SMA_PERIOD
+        if options.strategy == "lvdx": helper.main(sma_period)
+        else:
+            vol_default = helper.VIX_THRESHOLD if options.strategy == "amumbo" else helper.VXN_THRESHOLD
+            helper.main(options.vol_thresh if options.vol_thresh is not None else vol_default, sma_period)
+        return 0
+
+    decision = latest_decision(options.strategy, options.vol_thresh, options.sma_period, options.period)
+    timings = decision["timings"]
+    timings["total"] = process_seconds()
+    timings["startup"] = timings["total"]-timings["fetch"]-timings["decide"]
+    if options.json: print(json.dumps(decision))
+    else:
+        hint = ", consider adding to the position" if decision["add_hint"] else ""
+        print(f"{decision['strategy']}: {decision['step']} (exposure {decision['exposure']:.0%}{hint})")
+
+    if options.budget is not None and timings["startup"] > options.budget:
+        print(f"startup took {timings['startup']:.3f}s, budget is {options.budget:.3f}s", file=sys.stderr)
+        return 2
+    return 0
+
+
+# Run the script
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,123 @@
+import argparse
+import json
+import pandas as pd
+from typing import Dict, List, Optional
+from backtest import STEP_EXPOSURE, STRATEGIES, align_to, bar_dates, ladder_steps
+from indicators import multi_sma, rolling_quantiles
+from market_data import PriceCache, price_cache
+from signal_stream import HELPERS, LADDER_STEPS, M75_WINDOWS, VOL_FACTORS, signal_sma_windows
+
+# Strategies as declarative config: instruments (vol may be missing) and parameters, the default mirrors the helpers
+DEFAULT_CONFIG = {name: {"etf": etf, "index": index, "vol": vol, "vol_thresh": thresh, "sma_period": period}
+                  for name, (etf, index, vol, thresh, period) in STRATEGIES.items()}
+
+
+# Function to load a strategy config (JSON {name: {etf, index, vol, vol_thresh, sma_period}}), missing keys are
+# taken from the default strategy of the same name, vol_factors may be given per strategy as well
+def load_config(path: Optional[str] = None) -> Dict[str, dict]:
+    if path is None: return {name: dict(strategy) for name, strategy in DEFAULT_CONFIG.items()}
+    with open(path) as f: config = json.load(f)
+    return {name: {**DEFAULT_CONFIG.get(name, {"vol": None, "vol_thresh": None}), **strategy} for name, strategy in config.items()}
+
+
+# Function to collect what the strategies need: the windows of every symbol used as ETF or index and the volatility indices
+def required_indicators(config: Dict[str, dict]):
+    sma_windows, vol_symbols = dict(), list()
+    for strategy in config.values():
+        for role in ("etf", "index"):
+            windows = sma_windows.setdefault(strategy[role], list())
+            windows += [window for window in signal_sma_windows(strategy["sma_period"]) if window not in windows]
+        if strategy.get("vol") and strategy.get("vol_thresh") is not None and strategy["vol"] not in vol_symbols:
+            vol_symbols.append(strategy["vol"])
+    return sma_windows, vol_symbols
+
+
+# Function to compute every indicator once per symbol, no matter how many strategies use it
+# -> returns {symbol: {"dates", "close", "labels", "smas"}} and for volatility indices also "m75s"
+def compute_indicators(frames: Dict[str, pd.DataFrame], sma_windows: Dict[str, List[int]], vol_symbols: List[str]) -> dict:
+    indicators = dict()
+    for symbol in dict.fromkeys(list(sma_windows)+vol_symbols):
+        close = frames[symbol]['Close'].to_numpy(dtype=float)
+        entry = indicators[symbol] = {"dates": bar_dates(frames[symbol].index), "index": frames[symbol].index, "close": close}
+        if symbol in sma_windows: entry["smas"], entry["labels"] = multi_sma(close, sma_windows[symbol])
+        if symbol in vol_symbols: entry["m75s"], _ = rolling_quantiles(close, M75_WINDOWS, [0.75])
+    return indicators
+
+
+# Function to assemble the signal arrays of one strategy (as backtest.prepare_signals) from the shared indicators
+def strategy_signals(strategy: dict, indicators: dict) -> dict:
+    etf, index = indicators[strategy["etf"]], indicators[strategy["index"]]
+    labels = [f'SMA{window}' for window in signal_sma_windows(strategy["sma_period"])]
+    etf_rows = [etf["labels"].index(label) for label in labels]
+    index_rows = [index["labels"].index(label) for label in labels]
+    signals = {"dates": etf["index"], "labels": labels, "etf_close": etf["close"], "etf_smas": etf["smas"][etf_rows],
+               "index_close": align_to(etf["dates"], index["dates"], index["close"]),
+               "index_smas": align_to(etf["dates"], index["dates"], index["smas"][index_rows])}
+    if strategy.get("vol") and strategy.get("vol_thresh") is not None:
+        vol = indicators[strategy["vol"]]
+        signals["vol"] = align_to(etf["dates"], vol["dates"], vol["close"])
+        signals["m75s"] = align_to(etf["dates"], vol["dates"], vol["m75s"])
+    return signals
+
+
+# Function to run all strategies of a config on one batched download of every symbol they need
+# -> returns a table with one row per strategy (the decision of its latest ETF bar) and the loaded frames {symbol: bars}
+def run(config: Dict[str, dict], period: str = "2y", cache: PriceCache = price_cache):
+    sma_windows, vol_symbols = required_indicators(config)
+    frames = cache.history_many(list(dict.fromkeys(list(sma_windows)+vol_symbols)), '1d', period=period)
+    indicators = compute_indicators(frames, sma_windows, vol_symbols)
+
+    rows = list()
+    for name, strategy in config.items():
+        signals = strategy_signals(strategy, indicators)
+        vol_thresh = strategy.get("vol_thresh") if "vol" in signals else None
+        steps, hints = ladder_steps(signals, strategy["sma_period"], vol_thresh, strategy.get("vol_factors", VOL_FACTORS))
+        step = LADDER_STEPS[steps[-1]]
+        rows.append({"strategy": name, "date": signals["dates"][-1].date(), "step": step, "exposure": STEP_EXPOSURE[step],
+                     "add_hint": bool(hints[-1]), "etf": strategy["etf"], "close": signals["etf_close"][-1]})
+    return pd.DataFrame(rows), frames
+
+
+# Function to print the warnings of the strategy helpers and plot, using the data already loaded by run
+def run_helpers(config: Dict[str, dict], frames: Dict[str, pd.DataFrame]):
+    import importlib
+    for name, strategy in config.items():
+        if name not in HELPERS: continue
+        helper = importlib.import_module(HELPERS[name])
+        # helpers add their indicator columns, so every strategy gets its own copies
+        etf, index = frames[strategy["etf"]].copy(), frames[strategy["index"]].copy()
+        if strategy.get("vol"):
+            vol = frames[strategy["vol"]].copy()
+            helper.check_signals(index, etf, vol, strategy["vol_thresh"], strategy["sma_period"])
+            helper.plot_scraped_data(index, vol, strategy["vol_thresh"], strategy["sma_period"], ticker_name=strategy["index"])
+            helper.plot_scraped_data(etf, vol, strategy["vol_thresh"], strategy["sma_period"], ticker_name=strategy["etf"])
+        else:
+            helper.check_signals(index, etf, strategy["sma_period"])
+            helper.plot_scraped_data(index, strategy["sma_period"], ticker_name=strategy["index"])
+            helper.plot_scraped_data(etf, strategy["sma_period"], ticker_name=strategy["etf"])
+
+
+# Main function
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run several leveraged ETF strategies on one shared download")
+    parser.add_argument("strategies", nargs="*", help="strategies of the config to run (default: all)")
+    parser.add_argument("--config", help="JSON strategy config (default: the helpers' strategies)")
+    parser.add_argument("--period", default="2y", help="history to load (default: 2y like the helpers)")
+    parser.add_argument("--json", action="store_true", help="print the decisions as JSON")
+    parser.add_argument("--helpers", action="store_true", help="also print the helpers' warnings and plot")
+    options = parser.parse_args(args)
+
+    config = load_config(options.config)
+    unknown = [name for name in options.strategies if name not in config]
+    if unknown: parser.error(f"unknown strategies {unknown}")
+    if options.strategies: config = {name: config[name] for name in options.strategies}
+
+    table, frames = run(config, options.period)
+    if options.json: print(table.to_json(orient="records", date_format="iso"))
+    else: print(table.to_string(index=False))
+    if options.helpers: run_helpers(config, frames)
+
+
+# Run the script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence
+
+# Generator Settings
+END_DATE = "2024-12-31"  # fixed last bar, so generated data does not change from day to day
+SECTORS = ["Technology", "Financials", "Health Care", "Industrials", "Consumer", "Energy", "Utilities", "Materials"]
+COUNTRIES = ["USA", "Japan", "UK", "Germany", "France", "China", "Canada", "Switzerland"]
+
+
+# Function to generate a price history like the provider returns it (Open, High, Low, Close, Volume, Dividends,
+# Stock Splits), the close follows a geometric random walk with yearly drift and volatility (as fractions)
+# -> interval '1d' gives business days, '1mo' month starts, dividend_every pays dividend_yield/year spread over
+#    every n-th bar (0 for none)
+def price_history(bars: int, interval: str = "1d", seed: Optional[int] = None, start_price: float = 100.0,
+                  drift: float = 0.07, vol: float = 0.2, dividend_yield: float = 0.02, dividend_every: int = 3,
+                  end: str = END_DATE, tz: Optional[str] = "America/New_York") -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    per_year = 252 if interval == "1d" else 12
+    if interval == "1d": index = pd.bdate_range(end=end, periods=bars, tz=tz, name="Date")
+    elif interval == "1mo": index = pd.date_range(end=end, periods=bars, freq="MS", tz=tz, name="Date")
+    else: raise ValueError(f"Unsupported interval '{interval}'")
+
+    steps = rng.normal((drift-vol**2/2)/per_year, vol/np.sqrt(per_year), bars)
+    close = start_price*np.exp(np.cumsum(steps))
+    spread = np.abs(rng.normal(0, vol/np.sqrt(per_year), bars))
+    dividends = np.zeros(bars)
+    if dividend_every: dividends[dividend_every-1::dividend_every] = close[dividend_every-1::dividend_every]*dividend_yield*dividend_every/per_year
+    return pd.DataFrame({"Open": close*(1+rng.normal(0, spread/4)), "High": close*(1+spread), "Low": close*(1-spread),
+                         "Close": close, "Volume": rng.integers(10**5, 10**7, bars).astype(float),
+                         "Dividends": dividends, "Stock Splits": np.zeros(bars)}, index=index)
+
+
+# Function to generate the price histories of several symbols at once, volatility indices ('^V...') move like a VIX
+def price_histories(symbols: Sequence[str], bars: int, interval: str = "1d", seed: int = 0) -> Dict[str, pd.DataFrame]:
+    frames = dict()
+    for num, symbol in enumerate(symbols):
+        if symbol.startswith("^V"): frames[symbol] = volatility_index(bars, seed=seed+num)
+        else: frames[symbol] = price_history(bars, interval, seed=seed+num, drift=0.03+0.08*(num%5)/4,
+                                             vol=0.12+0.2*(num%7)/6)
+    return frames
+
+
+# Function to generate a daily volatility index (mean reverting around level with occasional spikes)
+def volatility_index(bars: int, seed: Optional[int] = None, level: float = 18.0, end: str = END_DATE) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    shocks = rng.normal(0, 0.06, bars) + np.where(rng.random(bars)<0.01, rng.uniform(0.2, 0.6, bars), 0)
+    log_level = np.empty(bars)
+    log_level[0] = np.log(level)
+    for num in range(1, bars): log_level[num] = log_level[num-1] + 0.05*(np.log(level)-log_level[num-1]) + shocks[num]
+    close = np.exp(log_level)
+    index = pd.bdate_range(end=end, periods=bars, tz="America/New_York", name="Date")
+    return pd.DataFrame({"Open": close, "High": close*1.03, "Low": close*0.97, "Close": close,
+                         "Volume": np.zeros(bars), "Dividends": np.zeros(bars), "Stock Splits": np.zeros(bars)}, index=index)
+
+
+# Function to generate an earnings table like the provider returns it ('Earnings Date' strings and 'Reported EPS'),
+# four reports per year plus the next scheduled report without EPS
+def earnings_table(years: int, seed: Optional[int] = None, eps: float = 2.0, end: str = END_DATE) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp(end)+pd.DateOffset(months=3), periods=years*4+1, freq="QS") + pd.Timedelta(days=24)
+    reported = eps*np.exp(np.cumsum(rng.normal(0.015, 0.08, len(dates))))
+    reported[-1] = np.nan
+    return pd.DataFrame({"Earnings Date": dates.strftime("%b %d, %Y, 4 PM EST"), "EPS Estimate": reported*0.98,
+                         "Reported EPS": reported})
+
+
+# Function to generate the holdings of several funds drawn from one universe of securities
+# -> popular securities (low numbers) are held by many funds, weights in % of the fund add up to top_share,
+#    returns DataFrames with the columns 'SYM', 'Assets', 'Sector' and 'Country'
+def etf_holdings(funds: int, holdings: int, universe: int, seed: Optional[int] = None,
+                 top_share: float = 60.0) -> List[pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    popularity = 1/np.arange(1, universe+1)**0.8
+    popularity /= popularity.sum()
+    sectors = rng.integers(0, len(SECTORS), universe)
+    countries = rng.integers(0, len(COUNTRIES), universe)
+    frames = list()
+    for _ in range(funds):
+        ids = rng.choice(universe, size=min(holdings, universe), replace=False, p=popularity)
+        weights = np.sort(rng.pareto(1.5, len(ids))+1)[::-1]
+        frames.append(pd.DataFrame({"SYM": [f"SEC{idx}" for idx in ids], "Assets": weights/weights.sum()*top_share,
+                                    "Sector": np.array(SECTORS)[sectors[ids]],
+                                    "Country": np.array(COUNTRIES)[countries[ids]]}))
+    return frames
+
+
+# Function to get an offline provider serving monthly histories, earnings and infos of generated symbols
+# -> the data ends this month (backend asks for the last 5 years), every third symbol has no earnings history
+#    (like most ETFs) and falls back to its trailing EPS
+def synthetic_provider(symbols: Sequence[str], months: int = 61, seed: int = 0):
+    from market_data import LocalProvider
+    end = str(pd.Timestamp.today().date())
+    frames = {symbol: price_history(months, "1mo", seed=seed+num, vol=0.2, dividend_every=3, end=end, tz=None)
+              for num, symbol in enumerate(symbols)}
+    earnings = {symbol: earnings_table(months//12+1, seed=seed+num, end=end) for num, symbol in enumerate(symbols) if num%3}
+    infos = {symbol: {"epsTrailingTwelveMonths": 2.0+num%5} for num, symbol in enumerate(symbols)}
+    return LocalProvider(frames, earnings, infos)
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+from correlation import correlation_matrix, return_correlation, rolling_correlations
+
+
+def _prices(bars: int = 300, symbols: int = 6, seed: int = 16) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    prices = np.exp(np.cumsum(rng.normal(0, 0.01, (bars, symbols)), axis=0))*100
+    prices[rng.random(prices.shape) < 0.05] = np.nan  # missing bars
+    prices[:, -1] = 50.0  # constant symbol
+    return pd.DataFrame(prices, columns=[f"S{num}" for num in range(symbols)])
+
+
+def test_last_rolling_window_equals_return_correlation():
+    prices, window = _prices(), 40
+    *_, (bar, last) = rolling_correlations(prices.to_numpy(), window)
+    assert bar == len(prices)-1
+    window_prices = prices.iloc[-window-1:]  # the window's returns start one bar later
+    expected = return_correlation(window_prices)
+    pd.testing.assert_frame_equal(pd.DataFrame(last*100, index=prices.columns, columns=prices.columns).round(2), expected)
+
+
+def test_every_rolling_window_equals_correlation_matrix():
+    prices, window = _prices(seed=7).to_numpy(), 25
+    for bar, matrix in rolling_correlations(prices, window):
+        np.testing.assert_allclose(matrix, correlation_matrix(prices[bar-window:bar+1], np.float64), atol=1e-12)
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from holdings import SymbolIndex, holdings_matrix, overlap_matrix
+
+
+# helper function with the four-level loop etf_pos_overlap_plot used before the sparse product
+def _loop_overlap(holdings):
+    overlap = np.zeros((len(holdings), len(holdings)))
+    for i, hold in enumerate(holdings):
+        total = np.sum(hold["Assets"].to_numpy())
+        for j, other in enumerate(holdings):
+            num = 0
+            for ticker, perc in zip(hold["SYM"].to_list(), hold["Assets"].to_list()):
+                if ticker in other["SYM"].to_list(): num += perc
+            overlap[i, j] = num/total
+    return overlap
+
+
+def test_intern_missing_symbols_as_unknown():
+    index = SymbolIndex()
+    assert index.intern(['A', 'B', np.nan, 'C']).tolist() == [0, 1, 2, 3]
+    assert index.symbols == ['A', 'B', 'Unknown', 'C']
+    assert index.intern([None, 'C', 'D', 'Unknown']).tolist() == [2, 3, 4, 2]
+    assert index.intern([]).tolist() == []
+
+
+def test_holdings_matrix_missing_symbol_keeps_weight():
+    weights, index = holdings_matrix([pd.DataFrame({"SYM": ['A', np.nan, 'C'], "Assets": [5.0, 3.0, 2.0]})])
+    assert weights.toarray().tolist() == [[5.0, 3.0, 2.0]]
+    assert index.symbols == ['A', 'Unknown', 'C']
+
+
+def test_overlap_matrix_matches_loop():
+    rng = np.random.default_rng(13)
+    universe = np.array([f"S{num}" for num in range(40)])
+    holdings = [pd.DataFrame({"SYM": rng.choice(universe, 10, replace=False), "Assets": rng.uniform(0, 10, 10).round(2)})
+                for _ in range(8)]
+    holdings[0].loc[3, "Assets"] = 0.0  # listed at zero weight still counts as held
+    weights, _ = holdings_matrix(holdings)
+    np.testing.assert_allclose(overlap_matrix(weights), _loop_overlap(holdings), rtol=1e-12)
@@ -0,0 +1,37 @@
+import instrument
+
+
+def _record(fn):
+    instrument.reset()
+    instrument.enable()
+    try: fn()
+    finally: instrument.disable()
+
+
+def test_totals_keep_labels_apart():
+    def run():
+        for chart in ("pe", "pe", "yields"):
+            with instrument.span("plot", chart=chart): pass
+        with instrument.span("fetch", "SPY"): pass
+    _record(run)
+    table = instrument.totals()
+    assert table[("plot", None, (("chart", "pe"), ))]["calls"] == 2
+    assert table[("plot", None, (("chart", "yields"), ))]["calls"] == 1
+    assert table[("fetch", "SPY", ())]["calls"] == 1
+    text = instrument.prometheus_text()
+    assert 'invest_tool_stage_calls{stage="plot",ticker="",chart="pe"} 2' in text
+    assert 'invest_tool_stage_calls{stage="fetch",ticker="SPY"} 1' in text
+
+
+def test_spans_bounded_totals_complete(tmp_path):
+    def run():
+        instrument.enable(max_spans=5)
+        for num in range(12):
+            with instrument.span("step", "SPY"): pass
+        instrument.enable()
+    _record(run)
+    kept = instrument.spans()
+    assert [record["id"] for record in kept] == list(range(7, 12))
+    assert instrument.totals()[("step", "SPY", ())]["calls"] == 12
+    instrument.export_json(str(tmp_path/"trace.json"))
+    assert '"dropped": 7' in (tmp_path/"trace.json").read_text()
@@ -0,0 +1,57 @@
+import time
+import pytest
+import synthetic_data as synth
+from market_data import fetch_concurrently
+
+
+# helper function to get a provider call failing with the given errors first, then delaying and returning its result
+def _flaky(errors=(), delay: float = 0.0, result="ok"):
+    calls = list()
+    def fn(*args):
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors): raise errors[len(calls)-1]
+        time.sleep(delay)
+        return result
+    return fn, calls
+
+
+@pytest.fixture
+def provider():
+    return synth.synthetic_provider(["AAA", "BBB", "CCC"])
+
+
+def test_local_provider_requests(provider):
+    results, errors = fetch_concurrently({**{(sym, 'history'): (provider.history, (sym, None, None, '1mo')) for sym in provider.frames},
+                                          ("ZZZ", 'history'): (provider.history, ("ZZZ", ))})
+    assert sorted(results) == [(sym, 'history') for sym in sorted(provider.frames)]
+    assert len(results[("AAA", 'history')]) == 61
+    assert isinstance(errors[("ZZZ", 'history')], KeyError)  # unknown symbol, not retried
+    assert sum(call[0] == "ZZZ" for call in provider.calls) == 1
+
+
+def test_transient_errors_retried_with_backoff(provider):
+    flaky, calls = _flaky([ConnectionError("reset"), TimeoutError("slow network")], result=provider.info("AAA"))
+    results, errors = fetch_concurrently({"info": (flaky, ())}, retries=3, backoff=0.05)
+    assert not errors and results["info"] == provider.info("AAA")
+    assert len(calls) == 3
+    assert calls[1]-calls[0] >= 0.05 and calls[2]-calls[1] >= 0.1  # backoff doubles per retry
+
+
+def test_permanent_and_exhausted_errors():
+    permanent, permanent_calls = _flaky([ValueError("bad symbol")])
+    transient, transient_calls = _flaky([ConnectionError("down")]*4)
+    results, errors = fetch_concurrently({"permanent": (permanent, ()), "transient": (transient, ())}, retries=2, backoff=0.01)
+    assert not results
+    assert isinstance(errors["permanent"], ValueError) and len(permanent_calls) == 1
+    assert isinstance(errors["transient"], ConnectionError) and len(transient_calls) == 3
+
+
+def test_timeout_enforced_on_retried_attempts():
+    # the slow request is resubmitted right after a retry of another request, before its thread starts
+    failing, _ = _flaky([ConnectionError("reset")]*2)
+    slow, slow_calls = _flaky(delay=0.5)
+    started = time.monotonic()
+    results, errors = fetch_concurrently({"a": (failing, ()), "slow": (slow, ())}, timeout=0.2, retries=3, backoff=0.05)
+    assert results == {"a": "ok"}
+    assert isinstance(errors["slow"], TimeoutError) and len(slow_calls) == 4
+    assert time.monotonic()-started < 4*0.5  # no attempt ran to its end
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from model_store import ModelStore
+from regression import three_layer_forecast
+
+TIMINGS, REPEAT, STEPS = [36, 24, 12, 6, 3], 3, range(12)
+
+
+def _series(bars: int = 80, seed: int = 24):
+    rng = np.random.default_rng(seed)
+    values = 100*np.exp(np.cumsum(rng.normal(0.005, 0.05, bars)))
+    return values, np.arange(bars, dtype=np.int64)*30  # any increasing dates
+
+
+def _forecast(store, values, dates):
+    forecasts, sources = store.batch_forecast(["SYN/Close"], [values], [dates], TIMINGS, REPEAT, STEPS)
+    return forecasts[0], sources
+
+
+@pytest.mark.parametrize("drop, add, revise", [(0, 1, False), (3, 0, False), (0, 0, True), (2, 3, True)],
+                         ids=["appended bar", "dropped head", "revised last bar", "all together"])
+def test_updated_forecast_equals_refit(tmp_path, drop, add, revise):
+    values, dates = _series()
+    _forecast(ModelStore(str(tmp_path)), values[:61], dates[:61])
+    new, new_dates = values[drop:61+add].copy(), dates[drop:61+add]
+    if revise: new[-1] *= 1.01  # e.g. the running month
+    forecast, sources = _forecast(ModelStore(str(tmp_path)), new, new_dates)  # loaded from disk like a new process
+    assert sources == ['updated']
+    np.testing.assert_allclose(forecast, three_layer_forecast(new, TIMINGS, REPEAT, STEPS), rtol=1e-9)
+
+
+def test_same_series_is_stored_and_rewritten_history_refitted(tmp_path):
+    values, dates = _series()
+    store = ModelStore(str(tmp_path))
+    first, sources = _forecast(store, values[:61], dates[:61])
+    assert sources == ['fitted']
+    again, sources = _forecast(store, values[:61], dates[:61])
+    assert sources == ['stored'] and np.array_equal(again, first)
+    adjusted = values[:62]*0.98  # e.g. dividend adjusted closes
+    forecast, sources = _forecast(store, adjusted, dates[:62])
+    assert sources == ['fitted']
+    np.testing.assert_allclose(forecast, three_layer_forecast(adjusted, TIMINGS, REPEAT, STEPS), rtol=1e-9)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import synthetic_data as synth
+from backtest import ladder_steps, prepare_signals
+from rules import RuleSet, ladder_rules
+from signal_stream import high_volatility, instrument_conditions, ladder_conditions, signal_sma_windows
+
+
+# helper function with the hand-written ladder conditions ladder_steps evaluated before the rule compiler
+def _reference_ladder(signals: dict, sma_period: int, vol_thresh=None):
+    labels = [f'SMA{window}' for window in signal_sma_windows(sma_period)]
+    rows = [signals["labels"].index(label) for label in labels]
+    index = instrument_conditions(signals["index_close"], dict(zip(labels, signals["index_smas"][rows])))
+    etf = instrument_conditions(signals["etf_close"], dict(zip(labels, signals["etf_smas"][rows])))
+    shape = signals["etf_close"].shape
+    high_vol = np.zeros(shape, dtype=bool) if vol_thresh is None else high_volatility(signals["vol"], signals["m75s"], vol_thresh)
+    steps, hint = ladder_conditions(high_vol, index, etf)
+    conditions = [np.broadcast_to(condition, shape) for _, condition in steps]
+    return np.select(conditions, np.arange(len(conditions)), default=len(conditions)), np.broadcast_to(hint, shape)
+
+
+@pytest.fixture(scope="module")
+def frames():
+    return synth.price_histories(["18MF.DE", "^GSPC", "^VIX"], 1500, "1d", seed=3)
+
+
+@pytest.mark.parametrize("sma_period", [50, 60, 92, 150, 250, 31])
+@pytest.mark.parametrize("vol_thresh", [None, 20, 28])
+def test_ladder_equals_hand_written_conditions(frames, sma_period, vol_thresh):
+    signals = prepare_signals(frames["18MF.DE"], frames["^GSPC"], frames["^VIX"], signal_sma_windows(sma_period))
+    steps, hint = ladder_steps(signals, sma_period, vol_thresh)
+    expected_steps, expected_hint = _reference_ladder(signals, sma_period, vol_thresh)
+    np.testing.assert_array_equal(steps, expected_steps)
+    np.testing.assert_array_equal(hint, expected_hint)
+    assert len(np.unique(steps)) > 3  # the history walks through several steps
+
+
+def test_thresholds_share_one_compiled_ladder(frames):
+    signals = prepare_signals(frames["18MF.DE"], frames["^GSPC"], frames["^VIX"])
+    ladder_rules.cache_clear()
+    for vol_thresh in (18.5, 22.25, 31.0): ladder_steps(signals, 50, vol_thresh)
+    assert ladder_rules.cache_info().currsize == 1
+
+
+def test_rule_set_equals_numpy_expressions():
+    rng = np.random.default_rng(23)
+    close, sma, rsi, a, b = (rng.normal(100, 5, 1000), rng.normal(100, 5, 1000), rng.uniform(0, 100, 1000),
+                             rng.normal(size=1000), rng.normal(size=1000))
+    a[::7] = np.nan
+    rules = RuleSet([("buy", "close > k*sma and not (rsi >= 70)"),
+                     ("hold", "abs(close-sma) < 0.5 or 1 < max(a, b) <= 3"),
+                     ("trim", "trend and rsi > 80")], "sell",
+                    definitions={"trend": "close > sma"}, flags={"watch": "-a > 1"}, params={"k": 1.02})
+    conditions = [(close > 1.02*sma) & ~(rsi >= 70),
+                  (np.abs(close-sma) < 0.5) | ((1 < np.fmax(a, b)) & (np.fmax(a, b) <= 3)),
+                  (close > sma) & (rsi > 80)]
+    outcomes, flags = rules.evaluate({"close": close, "sma": sma, "rsi": rsi, "a": a, "b": b})
+    np.testing.assert_array_equal(outcomes, np.select(conditions, np.arange(3), default=3))
+    np.testing.assert_array_equal(flags["watch"], -a > 1)
+    assert sorted(rules.variables()) == ["a", "b", "close", "rsi", "sma"]
+
+
+@pytest.mark.parametrize("condition", ["close <", "close @ 2", "f(x)", "close[0]", "loop"])
+def test_invalid_rules_raise(condition):
+    with pytest.raises(ValueError):
+        RuleSet([("x", condition)], "y", definitions={"loop": "loop"})
@@ -0,0 +1,11 @@
+import pytest
+import strat_cli
+
+
+@pytest.mark.parametrize("args, expected", [(["amumbo", "0"], (0, 50)), (["amumbo"], (28, 50)), (["amumbo", "25", "60"], (25, 60))])
+def test_plot_mode_keeps_explicit_zero(monkeypatch, args, expected):
+    helper = pytest.importorskip("amumbo_strat_helper")
+    calls = list()
+    monkeypatch.setattr(helper, "main", lambda *args: calls.append(args))
+    assert strat_cli.main(args) == 0
+    assert calls == [expected]
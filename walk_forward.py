@@ -0,0 +1,138 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from model_store import ModelStore, index_dates
+
+# Evaluation Settings
+TIMINGS = [36, 24, 12, 6, 3]  # time windows of the regressors (like compute_ticker_metrics)
+REPEAT = 3
+HORIZON = 12                  # months forecast at every cutoff
+WINDOW = 61                   # months the regressor sees at every cutoff (compute_ticker_metrics loads 5 years)
+CHUNK_SIZE = 16               # tickers per task sent to a worker
+
+
+# helper function to walk the cutoffs of a chunk of tickers, returns one array per ticker with a row per cutoff and
+# horizon (position of the first forecast bar, horizon, forecast, actual, naive forecast) and the number of fitted
+# and updated models
+# -> all tickers with enough history are forecast together for every date, consecutive cutoffs only move the window
+#    by one bar, so the model store updates the models instead of refitting them
+def _evaluate_chunk(series: List[np.ndarray], dates: List[np.ndarray], window: Optional[int], horizon: int,
+                    timings: List[int], repeat: int):
+    store = ModelStore(None)
+    depth = window or 2*max(timings)+1
+    targets = np.unique(np.concatenate([dts[depth:] for dts in dates]))  # dates of the first forecast bar
+    rows = [list() for _ in series]
+    sources = {"fitted": 0, "updated": 0, "stored": 0}
+    for target in targets:
+        nums, keys, values, value_dates = list(), list(), list(), list()
+        for num, (vals, dts) in enumerate(zip(series, dates)):
+            pos = int(np.searchsorted(dts, target))
+            if pos < depth or pos >= len(dts) or dts[pos] != target: continue
+            start = pos-window if window else 0
+            nums.append(num)
+            keys.append(str(num))
+            values.append(vals[start:pos])
+            value_dates.append(dts[start:pos])
+        if not nums: continue
+        forecasts, how = store.batch_forecast(keys, values, value_dates, timings, repeat, range(horizon))
+        for source in how: sources[source] += 1
+        for num, vals, forecast in zip(nums, values, forecasts):
+            pos = int(np.searchsorted(dates[num], target))
+            actual = np.full(horizon, np.nan)
+            known = series[num][pos:pos+horizon]
+            actual[:len(known)] = known
+            rows[num].append(np.column_stack([np.full(horizon, pos), np.arange(1, horizon+1), np.clip(forecast, 0, None),
+                                              actual, np.full(horizon, vals[-1])]))
+    return [np.concatenate(ticker_rows) if ticker_rows else np.empty((0, 5)) for ticker_rows in rows], sources
+
+
+# Function to backtest the three layer regressor walk-forward: at every historical month it forecasts the next
+# horizon months from the window bars before (all bars before if window is None) and compares with what happened
+# -> series are monthly closes {ticker: Series}, the naive forecast (last close) is evaluated next to it,
+#    tickers are split into chunks evaluated on a process pool (inline with max_workers=1)
+# -> returns one row per ticker, cutoff (last bar seen) and horizon (horizons past the last bar have NaN actuals),
+#    attrs hold the number of fitted and updated models and the runtime
+def walk_forward(series: Dict[str, pd.Series], window: Optional[int] = WINDOW, horizon: int = HORIZON,
+                 timings: List[int] = TIMINGS, repeat: int = REPEAT, max_workers: Optional[int] = None,
+                 chunk_size: int = CHUNK_SIZE) -> pd.DataFrame:
+    started = time.perf_counter()
+    tickers = list(series)
+    cleaned = [series[ticker].ffill().dropna() for ticker in tickers]
+    values = [s.to_numpy(dtype=float) for s in cleaned]
+    dates = [index_dates(s.index) for s in cleaned]
+    chunks = [range(pos, min(pos+chunk_size, len(tickers))) for pos in range(0, len(tickers), chunk_size)]
+    args = [([values[num] for num in chunk], [dates[num] for num in chunk], window, horizon, timings, repeat) for chunk in chunks]
+    if max_workers == 1: results = [_evaluate_chunk(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            results = [future.result() for future in [pool.submit(_evaluate_chunk, *arg) for arg in args]]
+
+    frames, sources = list(), {"fitted": 0, "updated": 0, "stored": 0}
+    for chunk, (arrays, chunk_sources) in zip(chunks, results):
+        for source, count in chunk_sources.items(): sources[source] += count
+        for num, rows in zip(chunk, arrays):
+            pos = rows[:, 0].astype(int)
+            frames.append(pd.DataFrame({"ticker": tickers[num], "cutoff": cleaned[num].index[pos-1],
+                                        "horizon": rows[:, 1].astype(int), "forecast": rows[:, 2],
+                                        "actual": rows[:, 3], "naive": rows[:, 4]}))
+    table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["ticker", "cutoff", "horizon", "forecast", "actual", "naive"])
+    table.attrs["models"] = sources
+    table.attrs["seconds"] = time.perf_counter()-started
+    return table
+
+
+# Function to get the MAE and MAPE (in %) of the regressor and of the naive forecast grouped by 'horizon' or 'ticker'
+# -> only rows with a known actual count, MAPE skips actuals of 0
+def error_summary(table: pd.DataFrame, by: str = "horizon") -> pd.DataFrame:
+    known = table[table["actual"].notna()]
+    actual = known["actual"].to_numpy()
+    nonzero = np.where(actual != 0, np.abs(actual), np.nan)
+    errors = pd.DataFrame({by: known[by].to_numpy(),
+                           "mae": np.abs(known["forecast"].to_numpy()-actual),
+                           "mape": np.abs(known["forecast"].to_numpy()-actual)/nonzero*100,
+                           "naive_mae": np.abs(known["naive"].to_numpy()-actual),
+                           "naive_mape": np.abs(known["naive"].to_numpy()-actual)/nonzero*100})
+    summary = errors.groupby(by).mean()
+    summary.insert(0, "count", errors.groupby(by).size())
+    # share of the naive forecast's error the regressor has (below 1 it beats the naive forecast)
+    summary["mae_ratio"] = summary["mae"]/summary["naive_mae"]
+    return summary
+
+
+# Main function
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Walk-forward evaluation of the three layer regressor on monthly closes")
+    parser.add_argument("tickers", nargs="*", help="tickers to evaluate")
+    parser.add_argument("--period", default="25y", help="history to load (default: 25y)")
+    parser.add_argument("--window", type=int, default=WINDOW, help=f"months seen at every cutoff, 0 for all (default: {WINDOW})")
+    parser.add_argument("--horizon", type=int, default=HORIZON, help=f"months forecast at every cutoff (default: {HORIZON})")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="evaluate N generated tickers instead (offline)")
+    options = parser.parse_args(args)
+    if not options.tickers and not options.synthetic: parser.error("give tickers or --synthetic N")
+
+    if options.synthetic:
+        import synthetic_data as synth
+        series = {f"SYN{num}": synth.price_history(300, "1mo", seed=num, tz=None)["Close"] for num in range(options.synthetic)}
+    else:
+        from market_data import fetch_concurrently, price_cache
+        fetched, failed = fetch_concurrently({sym: (price_cache.history, (sym, '1mo', None, None, options.period)) for sym in options.tickers})
+        for sym, err in failed.items(): print(f"Skipping {sym}: {err}")
+        series = {sym: fetched[sym]['Close'] for sym in options.tickers if sym in fetched}
+
+    table = walk_forward(series, options.window or None, options.horizon, max_workers=options.workers)
+    evaluations = table.drop_duplicates(["ticker", "cutoff"]).shape[0]
+    print(f"{evaluations} cutoff x ticker forecasts in {table.attrs['seconds']:.1f}s, models: {table.attrs['models']}\n")
+    with pd.option_context("display.width", 200, "display.float_format", "{:.3f}".format):
+        print(error_summary(table, "horizon").to_string(), "\n")
+        print(error_summary(table, "ticker").to_string())
+
+
+# Run the script
+if __name__ == "__main__":
+    main()